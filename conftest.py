@@ -0,0 +1,25 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_feed_caches():
+    """
+    Транзакция теста не коммитится, и колбэки on_commit, которые
+    сбрасывают кеши лент и страниц, не запускаются: кеши чистятся
+    перед каждым тестом.
+    """
+    from django.core.cache import cache
+
+    from posts.hot_feed import feed
+
+    cache.clear()
+    feed.clear()
+
+
+@pytest.fixture(autouse=True)
+def synchronous_thumbnails(settings):
+    """
+    Миниатюры рисуются в потоке теста: потоки пула делят общую базу
+    SQLite в памяти с блокировкой целых таблиц.
+    """
+    settings.THUMBNAIL_WORKERS = 0
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Post, Group, Comment, Follow
+from .search import filter_matching, match_expression, uses_fts
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +10,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 вместо LIKE '%...%' по всей таблице.
+        expression = match_expression(search_term)
+        if expression is None or not uses_fts():
+            return super().get_search_results(
+                request, queryset, search_term)
+        return filter_matching(queryset, expression), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("title", "slug", "description")
@@ -0,0 +1,129 @@
+"""
+Кеширование лент.
+
+Ключ фрагмента включает номер поколения своей ленты: главной, группы
+или автора. Изменение поста или комментария увеличивает поколение, и
+старые фрагменты просто перестают запрашиваться, поэтому их срок жизни
+можно делать долгим.
+
+get_or_recompute() пересчитывает значение в одном процессе, пока
+остальные получают устаревшую копию (stale-while-revalidate).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+GENERATION_KEY = 'feed-generation:{}'
+LOCK_KEY = '{}:lock'
+# Сколько ждать чужого пересчёта, если устаревшей копии нет.
+LOCK_WAIT = 2
+LOCK_POLL = 0.05
+
+
+def index_scope():
+    return 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def card_scope(author_id):
+    """Карточка автора: имя и счётчики подписок."""
+    return f'card:{author_id}'
+
+
+def _initial():
+    # Если счётчик вытеснен из кеша, новый отсчёт не должен совпасть
+    # со старыми номерами, поэтому он начинается с текущего времени.
+    return int(time.time() * 1000)
+
+
+def get_generation(scope):
+    key = GENERATION_KEY.format(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _initial(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def bump_generation(*scopes):
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial(), timeout=None)
+
+
+def post_scopes(post, group_ids=()):
+    """Ленты, в которых показан пост."""
+    scopes = {index_scope(), author_scope(post.author_id)}
+    for group_id in (post.group_id, *group_ids):
+        if group_id is not None:
+            scopes.add(group_scope(group_id))
+    return scopes
+
+
+def _store(key, value, timeout, stale_timeout):
+    cache.set(key, (time.time() + timeout, value), timeout + stale_timeout)
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_recompute(key, compute, timeout, stale_timeout=None):
+    """
+    Значение из кеша с мягким и жёстким сроком жизни.
+
+    После timeout секунд значение считается устаревшим: один процесс
+    берёт блокировку и пересчитывает его, остальные до конца пересчёта
+    получают старую копию. Через timeout + stale_timeout значение
+    исчезает из кеша. При ошибке базы отдаётся устаревшая копия, если
+    она есть.
+    """
+    if stale_timeout is None:
+        stale_timeout = settings.CACHE_STALE_TIMEOUT
+    lock_key = LOCK_KEY.format(key)
+    entry = cache.get(key)
+    if entry is not None:
+        fresh_until, value = entry
+        if time.time() < fresh_until:
+            return value
+        if not cache.add(lock_key, 1, LOCK_WAIT):
+            return value
+        try:
+            value = compute()
+        except DatabaseError:
+            return value
+        finally:
+            cache.delete(lock_key)
+        _store(key, value, timeout, stale_timeout)
+        return value
+
+    locked = cache.add(lock_key, 1, LOCK_WAIT)
+    if not locked:
+        entry = _wait_for(key)
+        if entry is not None:
+            return entry[1]
+    try:
+        value = compute()
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    _store(key, value, timeout, stale_timeout)
+    return value
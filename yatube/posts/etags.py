@@ -0,0 +1,54 @@
+"""
+ETag для страниц лент и поста.
+
+Валидатор собирается из поколений лент (см. caching.py) и того, кто
+смотрит страницу, поэтому ответ 304 не требует ни выборки постов, ни
+отрисовки шаблона. Last-Modified не отдаётся: pub_date не меняется
+при редактировании поста.
+"""
+import hashlib
+
+from django.conf import settings
+
+from .caching import (author_scope, card_scope, get_generation, group_scope,
+                      index_scope)
+from .models import Group, Post, User
+
+
+def _etag(request, *scopes):
+    user = request.user
+    parts = [get_generation(scope) for scope in scopes]
+    parts.append(user.pk if user.is_authenticated else 0)
+    # Страница поста содержит CSRF-токен формы комментария.
+    parts.append(request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def index_etag(request):
+    return _etag(request, index_scope())
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return None
+    return _etag(request, group_scope(group_id))
+
+
+def profile_etag(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return None
+    return _etag(request, author_scope(author_id), card_scope(author_id))
+
+
+def post_etag(request, username, post_id):
+    # order_by() убирает сортировку Post.Meta.ordering по pub_date.
+    author_id = Post.objects.filter(
+        pk=post_id, author__username=username
+    ).order_by().values_list('author', flat=True).first()
+    if author_id is None:
+        return None
+    return _etag(request, author_scope(author_id), card_scope(author_id))
@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from . import uploads
 from .models import Post, Comment
 
 
@@ -17,6 +19,36 @@ class PostForm(ModelForm):
             "text": "Текст"
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Обрезанную обработчиком загрузку Pillow не откроет, поэтому
+        # её убираем до проверки поля и отклоняем в clean_image().
+        image = self.files.get('image')
+        self.image_too_large = getattr(image, 'too_large', False)
+        if self.image_too_large:
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if self.image_too_large:
+            raise forms.ValidationError(
+                'Файл картинки слишком большой.', code='file_too_large')
+        if not isinstance(image, UploadedFile):
+            return image
+        # Размеры взяты из заголовка, картинка ещё не декодирована.
+        width, height = image.image.size
+        if uploads.too_many_pixels(width, height):
+            raise forms.ValidationError(
+                'Картинка слишком большая: %(width)s×%(height)s.',
+                code='too_many_pixels',
+                params={'width': width, 'height': height},
+            )
+        if (uploads.needs_downscale(width, height)
+                and not getattr(image.image, 'is_animated', False)):
+            image = uploads.downscale(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
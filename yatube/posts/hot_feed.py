@@ -0,0 +1,154 @@
+"""
+Голова главной ленты в памяти процесса.
+
+Каждый процесс держит settings.HOT_FEED_SIZE последних постов вместе с
+автором, группой и числом комментариев и отдаёт из них первые страницы
+главной без обращения к базе.
+
+Буфер помечен поколением главной ленты. Изменения в своём процессе
+применяются к буферу после коммита, а о чужих процесс узнаёт по сменившемуся
+поколению: буфер считается холодным, страница берётся из базы, а сам
+буфер перечитывается одним запросом.
+"""
+import threading
+
+from django.conf import settings
+
+from .caching import get_generation, index_scope
+from .models import Post
+from .paginator import decode_cursor
+
+
+def _key(post):
+    return post.pub_date, post.pk
+
+
+class HotFeed:
+
+    def __init__(self, size=None):
+        self.size = size
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._posts = []
+        self._generation = None
+        # Весь ли поток постов помещается в буфер.
+        self._complete = False
+
+    @property
+    def capacity(self):
+        return self.size or settings.HOT_FEED_SIZE
+
+    def warm_up(self):
+        self._load(get_generation(index_scope()))
+
+    def clear(self):
+        with self._lock:
+            self._posts = []
+            self._generation = None
+            self._complete = False
+
+    def _load(self, generation):
+        capacity = self.capacity
+        posts = list(
+            Post.objects.feed().order_by('-pub_date', '-pk')[:capacity])
+        with self._lock:
+            self._posts = posts
+            self._generation = generation
+            self._complete = len(posts) < capacity
+
+    def _snapshot(self, generation):
+        with self._lock:
+            if self._generation == generation:
+                return self._posts, self._complete
+        # Перечитывает буфер только один поток, остальные идут в базу.
+        if not self._reload_lock.acquire(blocking=False):
+            return None
+        try:
+            self._load(generation)
+        finally:
+            self._reload_lock.release()
+        with self._lock:
+            return self._posts, self._complete
+
+    def get_window(self, params, per_page, generation):
+        """
+        Окно страницы в формате CursorPaginator.get_window или None,
+        если страница не помещается в буфер.
+        """
+        number, after, before = params
+        if before or not self.capacity:
+            return None
+        snapshot = self._snapshot(generation)
+        if snapshot is None:
+            return None
+        posts, complete = snapshot
+        if after:
+            position = self._after_position(posts, after)
+        else:
+            position = self._offset_position(posts, complete, number,
+                                             per_page)
+        if position is None:
+            return None
+        start, number, cursor = position
+        items = posts[start:start + per_page + 1]
+        if len(items) <= per_page and not complete:
+            return None
+        return (items[:per_page], number, number > 1,
+                len(items) > per_page, cursor)
+
+    def _after_position(self, posts, after):
+        key = decode_cursor(after)
+        if key is None:
+            return None
+        number, pub_date, pk = key
+        start = len(posts)
+        for index, post in enumerate(posts):
+            if _key(post) < (pub_date, pk):
+                start = index
+                break
+        return start, max(number, 2), 'after:' + after
+
+    def _offset_position(self, posts, complete, number, per_page):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        number = min(max(number, 1), settings.PAGINATOR_MAX_OFFSET_PAGE)
+        start = (number - 1) * per_page
+        if complete and start >= len(posts) and number > 1:
+            number, start = 1, 0
+        return start, number, 'page:{}'.format(number)
+
+    def update(self, post_pk, deleted=False):
+        """
+        Применяет изменение поста к буферу. Вызывается после коммита,
+        когда поколение главной ленты увеличено на единицу.
+        """
+        generation = get_generation(index_scope())
+        with self._lock:
+            if (self._generation is None
+                    or generation != self._generation + 1):
+                # Пропущено чужое изменение: буфер перечитается.
+                self._generation = None
+                return
+        post = None
+        if not deleted:
+            post = Post.objects.feed().filter(pk=post_pk).first()
+        with self._lock:
+            if self._generation != generation - 1:
+                self._generation = None
+                return
+            posts = [item for item in self._posts if item.pk != post_pk]
+            if post is not None and (
+                    self._complete or (posts and _key(post) > _key(posts[-1]))
+            ):
+                posts.append(post)
+                posts.sort(key=_key, reverse=True)
+                if len(posts) > self.capacity:
+                    posts = posts[:self.capacity]
+                    self._complete = False
+            self._posts = posts
+            self._generation = generation
+
+
+feed = HotFeed()
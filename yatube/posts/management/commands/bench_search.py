@@ -0,0 +1,96 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.search import CREATE, TABLE, match_expression
+from posts.synthetic import text, vocabulary, zipf_weights
+
+CHUNK = 10000
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск через FTS5 с прежним icontains (LIKE) на '
+            'временной базе со сгенерированными постами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = vocabulary(5000, rng)
+        # Частоты слов по закону Ципфа, как в живом тексте.
+        weights = zipf_weights(len(words))
+        with tempfile.TemporaryDirectory() as directory, closing(
+                sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+        ) as db:
+            started = time.perf_counter()
+            self.fill(db, options['rows'], words, weights, rng)
+            filled = time.perf_counter()
+            for statement in CREATE:
+                db.execute(statement)
+            db.commit()
+            self.stdout.write(
+                f'Постов: {options["rows"]}, вставка '
+                f'{filled - started:.1f} с, индекс FTS5 '
+                f'{time.perf_counter() - filled:.1f} с')
+            queries = (words[0], words[100], words[3000],
+                       f'{words[10]} {words[50]}')
+            for query in queries:
+                self.compare(db, query, options['repeat'])
+
+    def fill(self, db, rows, words, weights, rng):
+        db.execute('PRAGMA journal_mode = off')
+        db.execute('PRAGMA synchronous = off')
+        db.execute('CREATE TABLE posts_post (id integer PRIMARY KEY, '
+                   'text text NOT NULL, pub_date datetime NOT NULL)')
+        db.execute('CREATE INDEX posts_post_pub_date '
+                   'ON posts_post (pub_date)')
+        start = datetime(2020, 1, 1)
+        for offset in range(0, rows, CHUNK):
+            db.executemany(
+                'INSERT INTO posts_post (text, pub_date) VALUES (?, ?)',
+                ((text(rng, words, weights),
+                  (start + timedelta(minutes=number)).isoformat(' '))
+                 for number in range(offset, min(offset + CHUNK, rows))))
+        db.commit()
+
+    def timed(self, db, sql, params, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = db.execute(sql, params).fetchall()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000, len(rows)
+
+    def compare(self, db, query, repeat):
+        limit = settings.COUNT_PAGINATOR * settings.PAGINATOR_MAX_OFFSET_PAGE
+        # Так Django строит text__icontains для каждого слова.
+        like = ' AND '.join(
+            ["text LIKE ? ESCAPE '\\'"] * len(query.split()))
+        paths = (
+            ('icontains', f'SELECT id FROM posts_post WHERE {like} '
+                          f'ORDER BY pub_date DESC LIMIT ?',
+             [f'%{word}%' for word in query.split()] + [limit]),
+            ('icontains, COUNT', f'SELECT COUNT(*) FROM posts_post '
+                                 f'WHERE {like}',
+             [f'%{word}%' for word in query.split()]),
+            ('FTS5 bm25', f'SELECT rowid FROM {TABLE} WHERE {TABLE} '
+                          f'MATCH ? ORDER BY rank, rowid DESC LIMIT ?',
+             [match_expression(query), limit]),
+            ('FTS5, COUNT', f'SELECT COUNT(*) FROM {TABLE} WHERE {TABLE} '
+                            f'MATCH ?', [match_expression(query)]),
+        )
+        self.stdout.write(f'«{query}»')
+        for name, sql, params in paths:
+            ms, rows = self.timed(db, sql, params, repeat)
+            self.stdout.write(f'  {name}: {ms:.1f} мс, строк {rows}')
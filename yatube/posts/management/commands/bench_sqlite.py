@@ -0,0 +1,189 @@
+import os
+import sqlite3
+import tempfile
+import multiprocessing
+import time
+import traceback
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.hot_feed import feed
+from posts.models import Group, Post, User
+
+# Настройки Django по умолчанию: журнал отката, соединение на запрос.
+DEFAULT_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(name, results, duration):
+    ms = [latency * 1000 for latencies, _ in results for latency in latencies]
+    errors = sum(errors for _, errors in results)
+    return (f'{name}: {len(ms)} запросов, '
+            f'{len(ms) / duration:.1f} в секунду, '
+            f'p50 {percentile(ms, 0.5):.1f} мс, '
+            f'p95 {percentile(ms, 0.95):.1f} мс, '
+            f'ошибок {errors}')
+
+
+class Command(BaseCommand):
+    help = ('Нагружает чтением главной (index) и публикацией постов '
+            '(new_post) временную копию базы: сначала с настройками '
+            'Django по умолчанию, затем с SQLITE_PRAGMAS и CONN_MAX_AGE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Секунд нагрузки на каждый режим.')
+        parser.add_argument('--posts', type=int, default=200,
+                            help='Сколько постов в базе перед нагрузкой.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        database = connections.databases['default']
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            self.stderr.write('Команда сравнивает только режимы SQLite.')
+            return
+        original = dict(database)
+        modes = (
+            ('По умолчанию', DEFAULT_PRAGMAS, 0),
+            ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS,
+             original.get('CONN_MAX_AGE', 0)),
+        )
+        # Отдельный кеш, чтобы не трогать кеш работающего сайта.
+        bench_cache = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bench-sqlite',
+        }}
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CACHES=bench_cache):
+            try:
+                template = os.path.join(directory, 'template.sqlite3')
+                self.use_database(database, template, 0)
+                self.seed()
+                for number, (name, pragmas, max_age) in enumerate(modes):
+                    path = os.path.join(directory, f'run{number}.sqlite3')
+                    self.copy(template, path)
+                    self.set_journal_mode(path, pragmas)
+                    self.use_database(database, path, max_age)
+                    # Режим журнала уже записан в файл: если каждый
+                    # воркер станет менять его сам, они упрутся в
+                    # «database is locked».
+                    pragmas = {key: value for key, value in pragmas.items()
+                               if key != 'journal_mode'}
+                    with override_settings(SQLITE_PRAGMAS=pragmas):
+                        self.run(name)
+            finally:
+                connections.close_all()
+                database.clear()
+                database.update(original)
+                feed.clear()
+
+    def use_database(self, database, path, max_age):
+        connections.close_all()
+        database['NAME'] = path
+        database['CONN_MAX_AGE'] = max_age
+
+    def copy(self, source, target):
+        connections.close_all()
+        with closing(sqlite3.connect(source)) as source_db, \
+                closing(sqlite3.connect(target)) as target_db:
+            source_db.backup(target_db)
+
+    def set_journal_mode(self, path, pragmas):
+        mode = pragmas.get('journal_mode', DEFAULT_PRAGMAS['journal_mode'])
+        with closing(sqlite3.connect(path)) as db:
+            db.execute(f'PRAGMA journal_mode = {mode}')
+
+    def seed(self):
+        call_command('migrate', verbosity=0)
+        author = User.objects.create_user(username='bench_author')
+        User.objects.create_user(username='bench_reader')
+        group = Group.objects.create(title='Bench', slug='bench')
+        for number in range(self.options['posts']):
+            Post.objects.create(text=f'Пост {number}', author=author,
+                                group=group if number % 2 else None)
+
+    def run(self, name):
+        # Процессы, а не потоки: как воркеры gunicorn, каждый со своим
+        # соединением и без общей GIL.
+        feed.clear()
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [('bench_reader', 'read')] * self.options['readers'] + [
+            ('bench_author', 'write')] * self.options['writers']
+        ready = context.Barrier(len(workers))
+        processes = [
+            context.Process(target=self.worker,
+                            args=(username, kind, ready, results))
+            for username, kind in workers
+        ]
+        for process in processes:
+            process.start()
+        by_kind = {'read': [], 'write': []}
+        for _ in processes:
+            kind, latencies, errors = results.get()
+            by_kind[kind].append((latencies, errors))
+        for process in processes:
+            process.join()
+        duration = self.options['duration']
+        self.stdout.write(name)
+        self.stdout.write('  ' + report('index', by_kind['read'], duration))
+        self.stdout.write(
+            '  ' + report('new_post', by_kind['write'], duration))
+        for kind, finished in by_kind.items():
+            if finished and not any(latencies for latencies, _ in finished):
+                raise CommandError(
+                    f'{name}: ни одного успешного запроса ({kind}).')
+
+    def worker(self, username, kind, ready, results):
+        latencies, errors = [], 0
+        try:
+            client = Client()
+            client.force_login(User.objects.get(username=username))
+            request = getattr(self, kind)
+            ready.wait()
+            deadline = time.monotonic() + self.options['duration']
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    ok = request(client)
+                except OperationalError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+        except Exception:
+            # Упавший воркер - тоже ошибка, а остальные процессы не
+            # должны ждать его у барьера.
+            errors += 1
+            ready.abort()
+            traceback.print_exc()
+        finally:
+            connections.close_all()
+            results.put((kind, latencies, errors))
+            results.close()
+            results.join_thread()
+            # Выход без atexit и сборки мусора унаследованного процесса.
+            os._exit(0)
+
+    def read(self, client):
+        return client.get(reverse('index')).status_code == 200
+
+    def write(self, client):
+        response = client.post(reverse('new_post'), {'text': 'Нагрузка'})
+        return response.status_code == 302
@@ -0,0 +1,242 @@
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.hot_feed import feed
+from posts.models import AuthorStats, Comment, Group, Post
+from yatube.metrics import QueryStats
+
+from .bench_sqlite import percentile
+
+# Чтения идут раньше записей: новый пост сбрасывает кеши лент.
+ENDPOINTS = ('index', 'group', 'profile', 'post', 'follow_index',
+             'new_post', 'add_comment')
+ROLES = ('anonymous', 'user')
+# Медленнее базы p95 на эту долю и хотя бы на столько мс - регрессия.
+NOISE_MS = 1.0
+
+
+def summary(size, endpoint, role, samples, allocations):
+    latencies = [latency * 1000 for latency, _, _, _ in samples]
+    return {
+        'size': size,
+        'endpoint': endpoint,
+        'role': role,
+        'requests': len(samples),
+        'status': sorted({status for _, status, _, _ in samples}),
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'queries': max(queries for _, _, queries, _ in samples),
+        'sql_ms': round(statistics.mean(
+            seconds * 1000 for _, _, _, seconds in samples), 2),
+        'alloc_kb': round(statistics.median(allocations) / 1024, 1),
+    }
+
+
+def regressions(baseline, results, threshold):
+    """
+    Строки о регрессиях results относительно baseline: p95 выросла
+    больше чем на threshold или запросов к базе стало больше.
+    """
+    def key(result):
+        return result['size'], result['endpoint'], result['role']
+
+    before = {key(result): result for result in baseline['results']}
+    found = []
+    for result in results['results']:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        name = '{} {} ({})'.format(*key(result))
+        if (result['p95_ms'] > old['p95_ms'] * (1 + threshold)
+                and result['p95_ms'] - old['p95_ms'] > NOISE_MS):
+            found.append(f'{name}: p95 {old["p95_ms"]} -> '
+                         f'{result["p95_ms"]} мс')
+        if result['queries'] > old['queries']:
+            found.append(f'{name}: запросов {old["queries"]} -> '
+                         f'{result["queries"]}')
+    return found
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, число и время SQL-запросов и выделенную '
+            'память для страниц posts.urls на временных базах разного '
+            'размера, анонимно и под пользователем.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Числа постов в базах через запятую.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Замеров на страницу и роль.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--cold', action='store_true',
+                            help='Без кеша: DummyCache вместо LocMem.')
+        parser.add_argument('--output', default='bench_urls.json')
+        parser.add_argument('--baseline',
+                            help='JSON прошлого запуска для сравнения.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый рост p95, доля.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes: числа через запятую.')
+        if options['requests'] < 1:
+            raise CommandError('--requests: хотя бы один замер.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+        backend = ('django.core.cache.backends.dummy.DummyCache'
+                   if options['cold'] else
+                   'django.core.cache.backends.locmem.LocMemCache')
+        # Отдельный кеш, чтобы не трогать кеш работающего сайта; метрики
+        # и журнал медленных запросов замеров в рабочие файлы не пишутся.
+        bench_cache = {'default': {'BACKEND': backend,
+                                   'LOCATION': 'bench-urls'}}
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CACHES=bench_cache, METRICS_PATH=None,
+                                  SLOW_QUERY_MS=None):
+            results = self.run_sizes(directory, sizes)
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'seed': options['seed'],
+            'cold': options['cold'],
+            'results': results,
+        }
+        with open(options['output'], 'w') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты: {options["output"]}')
+        if baseline is not None:
+            found = regressions(baseline, report, options['threshold'])
+            for line in found:
+                self.stderr.write(f'Регрессия: {line}')
+            if found:
+                raise CommandError(f'Регрессий: {len(found)}')
+
+    def run_sizes(self, directory, sizes):
+        # Реплика (если настроена) смотрит в ту же временную базу, иначе
+        # чтения лент шли бы в рабочий файл.
+        databases = connections.databases
+        originals = {alias: dict(databases[alias]) for alias in databases}
+        results = []
+        try:
+            for size in sizes:
+                connections.close_all()
+                for database in databases.values():
+                    database['NAME'] = os.path.join(
+                        directory, f'{size}.sqlite3')
+                self.seed(size)
+                results += self.run(size)
+        finally:
+            connections.close_all()
+            for alias, original in originals.items():
+                databases[alias].clear()
+                databases[alias].update(original)
+            feed.clear()
+        return results
+
+    def seed(self, size):
+        call_command('migrate', verbosity=0)
+        users = max(size // 100, 10)
+        call_command(
+            'generate_data', users=users, posts=size, comments=size * 3,
+            follows=min(users * 20, users * (users - 1)),
+            seed=self.options['seed'], prefix='bench', stdout=self.stdout)
+        cache.clear()
+        feed.clear()
+
+    def targets(self):
+        """Самые тяжёлые страницы базы и читатель с большой лентой."""
+        stats = AuthorStats.objects.select_related('author')
+        reader = stats.order_by('-following_count').first().author
+        author = stats.order_by('-posts_count').first().author
+        group = Group.objects.annotate(count=Count('posts')).order_by(
+            '-count', 'pk').first()
+        busiest = Comment.objects.values('post').annotate(
+            count=Count('pk')).order_by('-count', 'post').first()
+        post = Post.objects.select_related('author').get(
+            pk=busiest['post'])
+        return reader, {
+            'index': ('get', reverse('index'), None),
+            'group': ('get', reverse('group', args=[group.slug]), None),
+            'profile': ('get', reverse('profile', args=[author.username]),
+                        None),
+            'post': ('get', reverse('post', args=[post.author.username,
+                                                  post.pk]), None),
+            'follow_index': ('get', reverse('follow_index'), None),
+            'new_post': ('post', reverse('new_post'),
+                         {'text': 'Замер'}),
+            'add_comment': ('post', reverse(
+                'add_comment', args=[post.author.username, post.pk]),
+                {'text': 'Замер'}),
+        }
+
+    def run(self, size):
+        reader, targets = self.targets()
+        clients = {'anonymous': Client(), 'user': Client()}
+        clients['user'].force_login(reader)
+        results = []
+        for endpoint in ENDPOINTS:
+            for role in ROLES:
+                method, url, data = targets[endpoint]
+                request = getattr(clients[role], method)
+                samples, allocations = self.measure(request, url, data)
+                result = summary(size, endpoint, role, samples, allocations)
+                results.append(result)
+                self.stdout.write(
+                    f'{size} {endpoint} ({role}) {result["status"]}: '
+                    f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} '
+                    f'мс, p99 {result["p99_ms"]} мс, запросов '
+                    f'{result["queries"]}, SQL {result["sql_ms"]} мс, '
+                    f'память {result["alloc_kb"]} КБ')
+        return results
+
+    def measure(self, request, url, data):
+        for _ in range(self.options['warmup']):
+            request(url, data)
+        stats = QueryStats()
+        samples = []
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            for _ in range(self.options['requests']):
+                stats.count, stats.seconds = 0, 0.0
+                started = time.perf_counter()
+                response = request(url, data)
+                samples.append((time.perf_counter() - started,
+                                response.status_code, stats.count,
+                                stats.seconds))
+        # tracemalloc замедляет всё в разы, поэтому память меряем
+        # отдельно от задержек, на нескольких запросах. Трассировка
+        # перезапускается на каждый запрос, и пик - это пик запроса:
+        # tracemalloc.reset_peak() есть только с Python 3.9.
+        allocations = []
+        for _ in range(min(5, self.options['requests'])):
+            tracemalloc.start()
+            try:
+                request(url, data)
+                allocations.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        return samples, allocations
@@ -0,0 +1,185 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts import thumbnails
+from posts.models import ImageVariant, MediaFile, Post
+from posts.storage import post_image_storage, walk_files
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class NameSet:
+    """
+    Множество имён во временной базе SQLite: память не растёт вместе
+    с числом живых миниатюр.
+    """
+
+    def __init__(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = sqlite3.connect(
+            os.path.join(self.directory.name, 'names.sqlite3'))
+        self.db.execute('CREATE TABLE names (name TEXT PRIMARY KEY)')
+
+    def add_many(self, names):
+        self.db.executemany('INSERT OR IGNORE INTO names VALUES (?)',
+                            ((name,) for name in names))
+
+    def existing(self, names):
+        placeholders = ', '.join('?' * len(names))
+        rows = self.db.execute(
+            f'SELECT name FROM names WHERE name IN ({placeholders})', names)
+        return {name for name, in rows}
+
+    def close(self):
+        self.db.close()
+        self.directory.cleanup()
+
+
+def thumbnail_names(image_name):
+    """Имена всех миниатюр sorl, которые шаблоны ждут для картинки."""
+    source = thumbnails.source_file(image_name)
+    for geometry_string, options in settings.THUMBNAIL_GEOMETRIES.values():
+        name = thumbnails.backend.thumbnail_file(
+            source, geometry_string, **options).name
+        yield name
+        stem, extension = os.path.splitext(name)
+        for resolution in sorl_settings.THUMBNAIL_ALTERNATIVE_RESOLUTIONS:
+            yield f'{stem}@{resolution}x{extension}'
+
+
+class Command(BaseCommand):
+    help = ('Удаляет или переносит в карантин файлы картинок, вариантов и '
+            'миниатюр, на которые не ссылается ни один пост.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать найденные файлы.')
+        parser.add_argument('--quarantine', metavar='DIR',
+                            help='Переносить файлы в DIR, а не удалять.')
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help='Не трогать файлы моложе стольких секунд: '
+                                 'их пост может быть ещё не сохранён.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.storage = post_image_storage
+        self.checked = self.orphans = self.freed = 0
+        live_thumbnails = NameSet()
+        try:
+            self.mark_thumbnails(live_thumbnails)
+            areas = (
+                ('posts', self.live_images, self.dispose_images),
+                ('variants', self.live_variants, self.dispose(
+                    self.forget_variants)),
+                (sorl_settings.THUMBNAIL_PREFIX.strip('/'),
+                 live_thumbnails.existing, self.dispose(
+                     self.forget_thumbnails)),
+            )
+            for directory, live, dispose in areas:
+                self.sweep(directory, live, dispose)
+        finally:
+            live_thumbnails.close()
+        action = ('найдено' if options['dry_run'] else
+                  'в карантине' if options['quarantine'] else 'удалено')
+        self.stdout.write(
+            f'Проверено файлов: {self.checked}, {action}: {self.orphans}, '
+            f'байт: {self.freed}')
+
+    def mark_thumbnails(self, live_thumbnails):
+        images = (Post.objects.exclude(image='').exclude(image=None)
+                  .order_by().values_list('image', flat=True).distinct())
+        for batch in batched(images.iterator(), self.options['batch_size']):
+            live_thumbnails.add_many(
+                name for image_name in batch
+                for name in thumbnail_names(image_name))
+        stored = (Post.objects.exclude(thumbnail='').order_by()
+                  .values_list('thumbnail', flat=True).distinct())
+        live_thumbnails.add_many(stored.iterator())
+
+    def candidates(self, directory):
+        deadline = time.time() - self.options['min_age']
+        for name in walk_files(self.storage, directory):
+            if os.path.basename(name).startswith('.'):
+                continue
+            try:
+                stat = os.stat(self.storage.path(name))
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime <= deadline:
+                yield name, stat.st_size
+
+    def sweep(self, directory, live, dispose):
+        batches = batched(self.candidates(directory),
+                          self.options['batch_size'])
+        for batch in batches:
+            self.checked += len(batch)
+            alive = live([name for name, _ in batch])
+            orphans = [(name, size) for name, size in batch
+                       if name not in alive]
+            if orphans and not self.options['dry_run']:
+                orphans = dispose(orphans)
+            for name, size in orphans:
+                self.stdout.write(name)
+                self.orphans += 1
+                self.freed += size
+
+    def dispose(self, forget):
+        """Убирает файлы пачки и забывает их через forget(names)."""
+        def run(orphans):
+            for name, _ in orphans:
+                self.remove(name)
+            forget([name for name, _ in orphans])
+            return orphans
+        return run
+
+    def dispose_images(self, orphans):
+        # Картинку мог только что подхватить дубликат загрузки: файл
+        # убирается под блокировкой MediaFile и только без ссылок.
+        return [(name, size) for name, size in orphans
+                if MediaFile.delete_unused(name, self.remove)]
+
+    def remove(self, name):
+        quarantine = self.options['quarantine']
+        if not quarantine:
+            self.storage.delete(name)
+            return
+        target = os.path.join(quarantine, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(self.storage.path(name), target)
+
+    def live_images(self, names):
+        return set(Post.objects.filter(image__in=names)
+                   .values_list('image', flat=True))
+
+    def live_variants(self, names):
+        return set(ImageVariant.objects.filter(
+            file__in=names, source__in=Post.objects.values('image'),
+        ).values_list('file', flat=True))
+
+    def forget_variants(self, names):
+        ImageVariant.objects.filter(file__in=names).delete()
+
+    def forget_thumbnails(self, names):
+        # Иначе sorl будет считать удалённые миниатюры готовыми.
+        keys = [add_prefix(ImageFile(name, default.storage).key)
+                for name in names]
+        default.kvstore._delete_raw(*keys)
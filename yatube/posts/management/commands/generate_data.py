@@ -0,0 +1,304 @@
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posts import search, synthetic
+from posts.caching import bump_generation, index_scope
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineEntry, User)
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+# Доля постов, написанных «всплесками», и во сколько раз там чаще.
+BURST_SHARE = 0.3
+BURST_SPEEDUP = 20
+
+
+def insert_rows(model, fields, rows):
+    """
+    Вставка кортежей значений одним executemany в транзакции.
+    bulk_create тратит на подготовку каждого поля больше времени, чем
+    SQLite на саму запись, и упирается в 999 параметров на запрос.
+    Остальные поля получают то, что подставила бы модель: в схеме
+    базы Django умолчаний не задаёт.
+    """
+    quote = connection.ops.quote_name
+    defaults = [field for field in model._meta.concrete_fields
+                if not field.primary_key and field.name not in fields]
+    columns = [model._meta.get_field(name).column for name in fields]
+    columns += [field.column for field in defaults]
+    extra = tuple(field.get_db_prep_save(field.get_default(), connection)
+                  for field in defaults)
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(map(quote, columns)),
+        ', '.join(['%s'] * len(columns)))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, (row + extra for row in rows))
+
+
+def shares(rng, total, count, limit):
+    """
+    Делит total на count целых с распределением Парето (немногим
+    достаётся много), каждое не больше limit.
+    """
+    weights = [rng.paretovariate(1.5) for _ in range(count)]
+    scale = total / sum(weights) if weights else 0
+    result = array('L', (min(int(weight * scale), limit)
+                         for weight in weights))
+    # Остаток от округления вниз раздаём по одному случайным долям.
+    missing = min(total, count * limit) - sum(result)
+    while missing > 0:
+        index = rng.randrange(count)
+        if result[index] < limit:
+            result[index] += 1
+            missing -= 1
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу воспроизводимыми пользователями, группами, '
+            'постами, комментариями и подписками для нагрузочных замеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней от 2020-01-01 посты.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=20000)
+        parser.add_argument('--prefix', default='gen',
+                            help='Начало имён пользователей и слагов групп.')
+        parser.add_argument('--no-timelines', action='store_true',
+                            help='Не раскладывать посты в ленты подписок.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        users = options['users']
+        if users < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix!r} уже есть, '
+                f'задайте другой --prefix.')
+        started = time.monotonic()
+        # Счётчики AuthorStats по номеру пользователя: вставка в обход
+        # моделей не вызывает сигналов, которые обычно их ведут.
+        self.counts = {
+            'posts_count': array('L', [0]) * users,
+            'followers_count': array('L', [0]) * users,
+            'following_count': array('L', [0]) * users,
+        }
+        self.user_ids = self.create_users(users)
+        # Кто много пишет и на кого много подписываются - два разных
+        # перекоса по закону Ципфа; кто именно - решает seed.
+        self.writers = self.ranking(users)
+        self.celebrities = self.ranking(users)
+        self.user_weights = synthetic.zipf_weights(users, 1.1)
+        self.group_ids = self.create_groups(options['groups'])
+        self.group_weights = synthetic.zipf_weights(len(self.group_ids))
+        self.words = synthetic.vocabulary(5000, self.rng)
+        self.word_weights = synthetic.zipf_weights(len(self.words))
+        follows = self.create_follows(options['follows'])
+        posts, comments = self.create_posts(
+            options['posts'], options['comments'])
+        self.create_stats()
+        timelines = 0
+        if not options['no_timelines']:
+            timelines = self.fill_timelines()
+        bump_generation(index_scope())
+        self.stdout.write(
+            f'Пользователей: {users}, групп: {len(self.group_ids)}, '
+            f'подписок: {follows}, постов: {posts}, '
+            f'комментариев: {comments}, записей лент: {timelines} '
+            f'за {time.monotonic() - started:.1f} с')
+
+    def ranking(self, size):
+        ranking = array('L', range(size))
+        self.rng.shuffle(ranking)
+        return ranking
+
+    def pick(self, ranking, count):
+        """count номеров пользователей с перекосом к началу ranking."""
+        return [ranking[rank] for rank in self.rng.choices(
+            range(len(ranking)), cum_weights=self.user_weights, k=count)]
+
+    def chunks(self, total):
+        for offset in range(0, total, self.chunk_size):
+            yield offset, min(self.chunk_size, total - offset)
+
+    def create_users(self, count):
+        prefix = self.options['prefix']
+        date_joined = connection.ops.adapt_datetimefield_value(START)
+        for offset, size in self.chunks(count):
+            # Пароль «!» - такой, под которым нельзя войти.
+            insert_rows(User, ('username', 'password', 'date_joined'), (
+                (f'{prefix}{number}', '!', date_joined)
+                for number in range(offset, offset + size)))
+        return array('q', User.objects.filter(
+            username__startswith=prefix).order_by('pk').values_list(
+            'pk', flat=True).iterator())
+
+    def create_groups(self, count):
+        prefix = self.options['prefix']
+        with transaction.atomic():
+            Group.objects.bulk_create([
+                Group(title=f'Группа {number}', slug=f'{prefix}-{number}',
+                      description=f'Сообщество {number}')
+                for number in range(count)
+            ])
+        return list(Group.objects.filter(
+            slug__startswith=f'{prefix}-').order_by('pk').values_list(
+            'pk', flat=True))
+
+    def create_follows(self, total):
+        users = len(self.user_ids)
+        wanted = shares(self.rng, total, users, users - 1)
+        rows, created = [], 0
+        for user in range(users):
+            authors = {}
+            # Повторы и подписка на себя отбрасываются, поэтому
+            # популярных авторов приходится добирать.
+            for _ in range(10):
+                missing = wanted[user] - len(authors)
+                if missing <= 0:
+                    break
+                for author in self.pick(self.celebrities, missing * 2):
+                    if author != user and len(authors) < wanted[user]:
+                        authors[author] = None
+            # Кто подписан почти на всех, добирает равномерно.
+            while len(authors) < wanted[user]:
+                author = self.rng.randrange(users)
+                if author != user:
+                    authors[author] = None
+            for author in authors:
+                rows.append((self.user_ids[user], self.user_ids[author]))
+                self.counts['following_count'][user] += 1
+                self.counts['followers_count'][author] += 1
+            if len(rows) >= self.chunk_size:
+                insert_rows(Follow, ('user', 'author'), rows)
+                created += len(rows)
+                rows = []
+        insert_rows(Follow, ('user', 'author'), rows)
+        return created + len(rows)
+
+    def post_times(self, count):
+        """
+        Моменты публикаций по порядку. Часть постов идёт всплесками
+        с короткими паузами, остальные - с длинными.
+        """
+        mean = self.options['days'] * 86400 / max(count, 1)
+        quiet = mean * (1 - BURST_SHARE / BURST_SPEEDUP) / (1 - BURST_SHARE)
+        moment, bursting = START, False
+        for _ in range(count):
+            if self.rng.random() < 0.05:
+                bursting = self.rng.random() < BURST_SHARE
+            pause = mean / BURST_SPEEDUP if bursting else quiet
+            moment += timedelta(seconds=self.rng.expovariate(1 / pause))
+            yield moment
+
+    def create_posts(self, total, total_comments):
+        adapt = connection.ops.adapt_datetimefield_value
+        times = self.post_times(total)
+        comments_created = 0
+        for offset, size in self.chunks(total):
+            rows, dates = [], []
+            for author in self.pick(self.writers, size):
+                group = None
+                if self.group_ids and self.rng.random() < 0.7:
+                    group, = self.rng.choices(
+                        self.group_ids, cum_weights=self.group_weights)
+                pub_date = next(times)
+                dates.append(pub_date)
+                rows.append((synthetic.text(self.rng, self.words,
+                                            self.word_weights),
+                             adapt(pub_date), self.user_ids[author], group))
+                self.counts['posts_count'][author] += 1
+            with transaction.atomic():
+                if search.uses_fts():
+                    # Триггер индексирует посты по одному, а одна
+                    # вставка всей пачки в FTS5 втрое быстрее. DDL в
+                    # SQLite транзакционен, так что при ошибке триггер
+                    # вернётся сам.
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f'DROP TRIGGER {search.INSERT_TRIGGER}')
+                insert_rows(Post, ('text', 'pub_date', 'author', 'group'),
+                            rows)
+                # Внутри транзакции других писателей нет, поэтому id
+                # новых постов идут подряд до последнего.
+                last = Post.objects.order_by('-pk').values_list(
+                    'pk', flat=True).first()
+                if search.uses_fts():
+                    self.index_posts(last - size + 1, last)
+                # Комментариев на долю пачки столько, чтобы в сумме
+                # вышло ровно total_comments.
+                quota = (total_comments * (offset + size) // total
+                         - total_comments * offset // total)
+                comments = self.comments_for(
+                    range(last - size + 1, last + 1), dates, quota)
+                insert_rows(Comment, ('post', 'author', 'text', 'created'),
+                            comments)
+            comments_created += len(comments)
+        return total, comments_created
+
+    def index_posts(self, first, last):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {search.TABLE}(rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table} '
+                f'WHERE id BETWEEN %s AND %s', (first, last))
+            cursor.execute(search.CREATE_INSERT_TRIGGER)
+
+    def comments_for(self, post_ids, dates, count):
+        adapt = connection.ops.adapt_datetimefield_value
+        # Одни посты обсуждают, другие нет.
+        weights = [self.rng.paretovariate(1.5) for _ in post_ids]
+        posts = self.rng.choices(range(len(post_ids)), weights, k=count)
+        authors = self.pick(self.writers, count)
+        return [
+            (post_ids[post], self.user_ids[author],
+             synthetic.text(self.rng, self.words, self.word_weights, 1, 15),
+             adapt(dates[post] + timedelta(
+                 seconds=self.rng.expovariate(1 / 3600))))
+            for post, author in zip(posts, authors)
+        ]
+
+    def create_stats(self):
+        fields = tuple(self.counts)
+        for offset, size in self.chunks(len(self.user_ids)):
+            insert_rows(AuthorStats, ('author',) + fields, (
+                (self.user_ids[index],) + tuple(
+                    self.counts[field][index] for field in fields)
+                for index in range(offset, offset + size)))
+
+    def fill_timelines(self):
+        """
+        Ленты подписок, как их разложил бы fan_out: все посты авторов,
+        на которых подписан пользователь, кроме популярных.
+        """
+        follow = Follow._meta.db_table
+        post = Post._meta.db_table
+        stats = AuthorStats._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {TimelineEntry._meta.db_table} '
+                f'(user_id, post_id, pub_date) '
+                f'SELECT f.user_id, p.id, p.pub_date FROM {follow} f '
+                f'JOIN {post} p ON p.author_id = f.author_id '
+                f'JOIN {stats} s ON s.author_id = f.author_id '
+                f'WHERE f.user_id BETWEEN %s AND %s '
+                f'AND s.followers_count <= %s',
+                (self.user_ids[0], self.user_ids[-1],
+                 settings.TIMELINE_FANOUT_LIMIT))
+            return cursor.rowcount
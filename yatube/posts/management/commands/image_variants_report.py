@@ -0,0 +1,44 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts.models import ImageVariant
+
+
+class Command(BaseCommand):
+    help = ('Показывает, сколько байт экономят варианты картинок по '
+            'сравнению с исходниками и самым широким JPEG.')
+
+    def handle(self, *args, **options):
+        by_source = defaultdict(dict)
+        rows = ImageVariant.objects.values_list(
+            'source', 'width', 'format', 'size')
+        for source, width, image_format, size in rows.iterator():
+            by_source[source][width, image_format] = size
+        if not by_source:
+            self.stdout.write('Вариантов картинок нет.')
+            return
+
+        originals = 0
+        totals = defaultdict(lambda: [0, 0])
+        for source, sizes in by_source.items():
+            if default_storage.exists(source):
+                originals += default_storage.size(source)
+            # База сравнения: то, что качал бы клиент без srcset.
+            baseline = max(
+                (size for (width, image_format), size in sizes.items()
+                 if image_format == ImageVariant.JPEG),
+                default=max(sizes.values()))
+            for key, size in sizes.items():
+                totals[key][0] += size
+                totals[key][1] += baseline
+
+        self.stdout.write(
+            f'Картинок: {len(by_source)}, исходники: {originals} байт')
+        for (width, image_format), (size, baseline) in sorted(totals.items()):
+            saved = baseline - size
+            percent = saved * 100 // baseline if baseline else 0
+            self.stdout.write(
+                f'{width}w {image_format}: {size} байт, '
+                f'экономия {saved} байт ({percent}%)')
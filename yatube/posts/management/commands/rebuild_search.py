@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.search import OPTIMIZE, REBUILD, TABLE, uses_fts
+
+
+class Command(BaseCommand):
+    help = ('Заново строит индекс полнотекстового поиска по постам и '
+            'сливает его сегменты.')
+
+    def handle(self, *args, **options):
+        if not uses_fts():
+            raise CommandError('Индекс FTS5 есть только в SQLite.')
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD)
+            cursor.execute(OPTIMIZE)
+            cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+            count, = cursor.fetchone()
+        self.stdout.write(f'Проиндексировано постов: {count}')
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import AuthorStats, Follow, Post, User
+
+
+def _count(queryset, field):
+    counts = (queryset.filter(**{field: OuterRef('pk')}).order_by()
+              .values(field).annotate(count=Count('pk')).values('count'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики AuthorStats с данными и чинит расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_pk = 0
+        checked = repaired = 0
+        while True:
+            with transaction.atomic():
+                authors = list(
+                    User.objects.filter(pk__gt=last_pk).order_by('pk')
+                    .annotate(
+                        real_posts=_count(Post.objects, 'author'),
+                        real_followers=_count(Follow.objects, 'author'),
+                        real_following=_count(Follow.objects, 'user'),
+                    )
+                    .values('pk', 'real_posts', 'real_followers',
+                            'real_following')[:chunk_size]
+                )
+                if not authors:
+                    break
+                last_pk = authors[-1]['pk']
+                repaired += self.repair_chunk(authors)
+            checked += len(authors)
+        self.stdout.write(
+            f'Проверено авторов: {checked}, исправлено: {repaired}')
+
+    def repair_chunk(self, authors):
+        stored = AuthorStats.objects.in_bulk(
+            [author['pk'] for author in authors])
+        changed, missing = [], []
+        for author in authors:
+            real = {
+                'posts_count': author['real_posts'],
+                'followers_count': author['real_followers'],
+                'following_count': author['real_following'],
+            }
+            stats = stored.get(author['pk'])
+            if stats is None:
+                missing.append(AuthorStats(author_id=author['pk'], **real))
+            elif any(getattr(stats, field) != value
+                     for field, value in real.items()):
+                for field, value in real.items():
+                    setattr(stats, field, value)
+                changed.append(stats)
+        AuthorStats.objects.bulk_create(missing)
+        AuthorStats.objects.bulk_update(
+            changed, ['posts_count', 'followers_count', 'following_count'])
+        return len(changed) + len(missing)
@@ -0,0 +1,70 @@
+import os
+import shutil
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.caching import post_scopes
+from posts.models import ImageVariant, MediaFile, Post
+from posts.signals import invalidate, post_paths
+from posts.storage import (content_hash, hashed_name, is_hashed,
+                           post_image_storage, walk_files)
+
+UPLOAD_DIR = 'posts'
+
+
+class Command(BaseCommand):
+    help = ('Переименовывает старые картинки постов по хешу содержимого. '
+            'Прерванный запуск можно просто повторить.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Сколько файлов обработать за запуск.')
+
+    def handle(self, *args, **options):
+        storage = post_image_storage
+        done = 0
+        for name in walk_files(storage, UPLOAD_DIR):
+            if options['limit'] is not None and done >= options['limit']:
+                break
+            if is_hashed(name) or os.path.basename(name).startswith('.'):
+                continue
+            new_name = self.rehash(storage, name)
+            self.stdout.write(f'{name} -> {new_name}')
+            done += 1
+        self.stdout.write(f'Переименовано файлов: {done}')
+
+    def rehash(self, storage, name):
+        with open(storage.path(name), 'rb') as source:
+            new_name = hashed_name(name, content_hash(File(source)))
+        new_path = storage.path(new_name)
+        if not os.path.exists(new_path):
+            directory, filename = os.path.split(new_path)
+            os.makedirs(directory, exist_ok=True)
+            temp_path = os.path.join(directory, '.rehash-' + filename)
+            shutil.copyfile(storage.path(name), temp_path)
+            os.replace(temp_path, new_path)
+        # Старый файл удаляется только после того, как посты переведены
+        # на новое имя: при сбое повторный запуск продолжит с него же.
+        with transaction.atomic():
+            self.move_references(name, new_name)
+        os.remove(storage.path(name))
+        return new_name
+
+    def move_references(self, name, new_name):
+        posts = list(Post.objects.filter(image=name).select_related(
+            'author'))
+        if not posts:
+            return
+        # update() сохраняет готовые миниатюры: содержимое то же.
+        Post.objects.filter(image=name).update(image=new_name)
+        refs = Post.objects.filter(image=new_name).count()
+        MediaFile.objects.update_or_create(
+            name=new_name, defaults={'refs': refs})
+        if ImageVariant.objects.filter(source=new_name).exists():
+            ImageVariant.objects.filter(source=name).delete()
+        else:
+            ImageVariant.objects.filter(source=name).update(source=new_name)
+        for post in posts:
+            invalidate(post_scopes(post), post_paths(post))
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def _render(image_name):
+    try:
+        thumbnails.render(image_name)
+        return None
+    except Exception as error:
+        return error
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Рисует миниатюры картинок существующих постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        images = list(
+            Post.objects.exclude(image='').exclude(image=None)
+            .order_by().values_list('image', flat=True).distinct())
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for image_name, error in zip(images, pool.map(_render, images)):
+                if error is None:
+                    done += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'{image_name}: {error}')
+        self.stdout.write(
+            f'Картинок обработано: {done}, с ошибками: {failed}')
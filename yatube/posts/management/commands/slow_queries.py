@@ -0,0 +1,99 @@
+import json
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SORTS = {
+    'total': lambda group: group['total_ms'],
+    'max': lambda group: group['max_ms'],
+    'count': lambda group: group['count'],
+}
+
+
+def log_files(path):
+    """Журнал и его ротированные копии, от старых к новым."""
+    rotated = []
+    number = 1
+    while os.path.exists(f'{path}.{number}'):
+        rotated.append(f'{path}.{number}')
+        number += 1
+    files = rotated[::-1]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def aggregate(entries):
+    """Записи журнала, сгруппированные по отпечатку SQL."""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'normalized': entry['normalized'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'views': Counter(),
+            'places': Counter(),
+            'slowest': entry,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        if entry['ms'] >= group['max_ms']:
+            group['max_ms'] = entry['ms']
+            group['slowest'] = entry
+        group['views'][entry['view'] or '-'] += 1
+        if entry['template']:
+            place = f'{entry["template"]}:{entry["line"]}'
+        else:
+            place = entry['source'] or '-'
+        group['places'][place] += 1
+    return list(groups.values())
+
+
+def top(counter):
+    return ', '.join(f'{name} ({count})'
+                     for name, count in counter.most_common(3))
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов: худшие запросы по '
+            'отпечатку SQL с представлениями и местами в шаблонах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG)
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--sort', choices=SORTS, default='total',
+                            help='Суммарное время, худшее или число.')
+
+    def handle(self, *args, **options):
+        files = log_files(options['log'])
+        if not files:
+            raise CommandError(f'Журнала {options["log"]} нет.')
+        entries, broken = [], 0
+        for name in files:
+            with open(name, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        broken += 1
+        groups = sorted(aggregate(entries), key=SORTS[options['sort']],
+                        reverse=True)
+        self.stdout.write(
+            f'Медленных запросов: {len(entries)}, разных: {len(groups)}'
+            + (f', битых строк: {broken}' if broken else ''))
+        for number, group in enumerate(groups[:options['top']], 1):
+            slowest = group['slowest']
+            self.stdout.write(
+                f'\n#{number} {group["fingerprint"]}: '
+                f'{group["count"]} раз, всего {group["total_ms"]:.1f} мс, '
+                f'худший {group["max_ms"]:.1f} мс')
+            self.stdout.write(f'  {group["normalized"][:300]}')
+            self.stdout.write(f'  Представления: {top(group["views"])}')
+            self.stdout.write(f'  Откуда: {top(group["places"])}')
+            self.stdout.write(f'  Параметры худшего: {slowest["params"]}')
+            for step in slowest['plan'] or ():
+                self.stdout.write(f'  План: {step}')
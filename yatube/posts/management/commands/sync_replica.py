@@ -0,0 +1,41 @@
+import sqlite3
+from contextlib import closing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from posts.caching import (author_scope, bump_generation, card_scope,
+                           group_scope, index_scope)
+from posts.models import Group, User
+from yatube.replica import REPLICA_ALIAS, replica_configured
+
+
+class Command(BaseCommand):
+    help = ('Копирует базу default в файл реплики SQLite '
+            '(settings.REPLICA_DATABASE) и сбрасывает кеши лент.')
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('Реплика не настроена: задайте '
+                               'REPLICA_DATABASE.')
+        source = connections[DEFAULT_DB_ALIAS]
+        replica = connections.databases[REPLICA_ALIAS]
+        if source.vendor != 'sqlite' or not replica['ENGINE'].endswith(
+                'sqlite3'):
+            raise CommandError('Настоящую реплику обновляет сама СУБД.')
+        source.ensure_connection()
+        # Backup API пишет в ту же базу на месте, поэтому открытые
+        # соединения с репликой видят новую копию, а не старый файл.
+        with closing(sqlite3.connect(replica['NAME'])) as target:
+            source.connection.backup(target)
+        # Страницы, собранные по отставшей реплике, могли попасть в кеш
+        # под текущими поколениями лент.
+        bump_generation(
+            index_scope(),
+            *(group_scope(pk) for pk in Group.objects.values_list(
+                'pk', flat=True).iterator()),
+            *(scope for pk in User.objects.values_list(
+                'pk', flat=True).iterator()
+              for scope in (author_scope(pk), card_scope(pk))),
+        )
+        self.stdout.write(f'Реплика обновлена: {replica["NAME"]}')
@@ -0,0 +1,94 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+
+from yatube import metrics
+
+from .caching import bump_generation, get_generation
+
+PAGE_KEY = 'page-cache:{}:{}:{}'
+
+
+def _path_scope(path):
+    return 'path:' + hashlib.md5(path.encode()).hexdigest()
+
+
+def purge_paths(*paths):
+    """Сбрасывает кеш страниц по путям вместе со всеми query string."""
+    bump_generation(*(_path_scope(path) for path in paths))
+
+
+def _count(name):
+    # Только метрики: запись счётчика в общий кеш на каждый анонимный
+    # запрос сбрасывала бы L1 во всех процессах.
+    metrics.inc('yatube_page_cache_total', result=name)
+
+
+def page_cache_stats():
+    values = metrics.registry.collect()
+    return {name: int(values.get(
+        ('yatube_page_cache_total', f'result="{name}"', ''), 0))
+        for name in ('hits', 'misses')}
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кеш целых страниц для анонимных посетителей.
+
+    Кешируются только GET/HEAD-запросы к представлениям из
+    settings.PAGE_CACHE_VIEWS без cookie сессии. Ответы, которые ставят
+    cookie (например, CSRF), не кешируются. Ключ состоит из пути, его
+    поколения и query string; сигналы моделей сбрасывают поколения
+    затронутых путей через purge_paths().
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cache_key = getattr(request, '_page_cache_key', None)
+        if cache_key is not None and self._cacheable(request, response):
+            cache.set(cache_key, response, settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self._applies(request):
+            return None
+        cache_key = PAGE_KEY.format(
+            _path_scope(request.path),
+            get_generation(_path_scope(request.path)),
+            hashlib.md5(request.META.get(
+                'QUERY_STRING', '').encode()).hexdigest(),
+        )
+        response = cache.get(cache_key)
+        if response is not None:
+            _count('hits')
+            response['X-Page-Cache'] = 'HIT'
+            return get_conditional_response(
+                request, etag=response.get('ETag'), response=response)
+        _count('misses')
+        request._page_cache_key = cache_key
+        return None
+
+    def _applies(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.url_name in settings.PAGE_CACHE_VIEWS
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    def _cacheable(self, request, response):
+        # Cookie CSRF ставится снаружи, поэтому смотрим на сам факт
+        # использования токена при отрисовке.
+        session = getattr(request, 'session', None)
+        return (
+            response.status_code == 200
+            and not request.META.get('CSRF_COOKIE_USED')
+            and not (session is not None and session.modified)
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+        )
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_author_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+
+    def counts(model, field):
+        return dict(model.objects.values_list(field)
+                    .annotate(count=models.Count('pk')).order_by())
+
+    posts = counts(Post, 'author')
+    followers = counts(Follow, 'author')
+    following = counts(Follow, 'user')
+    AuthorStats.objects.bulk_create([
+        AuthorStats(author_id=pk,
+                    posts_count=posts.get(pk, 0),
+                    followers_count=followers.get(pk, 0),
+                    following_count=following.get(pk, 0))
+        for pk in User.objects.values_list('pk', flat=True).iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0011_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(db_index=True, max_length=255)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('format', models.CharField(choices=[('JPEG', 'JPEG'), ('WEBP', 'WebP')], max_length=4)),
+                ('file', models.CharField(max_length=255)),
+                ('size', models.PositiveIntegerField()),
+            ],
+            options={
+                'ordering': ['source', 'format', 'width'],
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_srcset',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_webp_srcset',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='imagevariant',
+            constraint=models.UniqueConstraint(fields=('source', 'width', 'format'), name='unique_image_variant'),
+        ),
+    ]
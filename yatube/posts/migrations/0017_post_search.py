@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# SQL заморожен: posts.search держит свою копию для команд, и её правки
+# не должны менять то, что применяет эта миграция.
+# remove_diacritics 2: «ё» совпадает с «е».
+CREATE = (
+    "CREATE VIRTUAL TABLE posts_post_search USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER posts_post_search_insert AFTER INSERT ON posts_post "
+    "BEGIN "
+    "INSERT INTO posts_post_search(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "CREATE TRIGGER posts_post_search_delete AFTER DELETE ON posts_post "
+    "BEGIN "
+    "INSERT INTO posts_post_search(posts_post_search, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    "CREATE TRIGGER posts_post_search_update AFTER UPDATE OF text "
+    "ON posts_post BEGIN "
+    "INSERT INTO posts_post_search(posts_post_search, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO posts_post_search(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "INSERT INTO posts_post_search(posts_post_search) VALUES ('rebuild')",
+)
+DROP = (
+    'DROP TRIGGER IF EXISTS posts_post_search_insert',
+    'DROP TRIGGER IF EXISTS posts_post_search_delete',
+    'DROP TRIGGER IF EXISTS posts_post_search_update',
+    'DROP TABLE IF EXISTS posts_post_search',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 есть только в SQLite; на других СУБД поиск идёт через
+        # icontains (posts/search.py).
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
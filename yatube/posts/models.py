@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth import get_user_model
 
+from .storage import is_hashed, post_image_storage
 
 User = get_user_model()
 
@@ -14,6 +16,21 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """
+        Посты для ленты: автор и группа одним JOIN, число комментариев
+        подзапросом, чтобы post_item.html не делал запросов на каждый пост.
+        """
+        comments = (Comment.objects.filter(post=models.OuterRef('pk'))
+                    .order_by().values('post')
+                    .annotate(count=models.Count('pk')).values('count'))
+        return self.select_related('author', 'group').annotate(
+            comment_count=Coalesce(
+                models.Subquery(comments, output_field=models.IntegerField()),
+                0))
+
+
 class Post(models.Model):
     text = models.TextField(blank=False, null=False)
     pub_date = models.DateTimeField(
@@ -31,16 +48,41 @@ class Post(models.Model):
 
     image = models.ImageField(
         upload_to='posts/',
+        storage=post_image_storage,
         blank=True,
         null=True
     )
+    # Готовая миниатюра для ленты, записывается фоновым пулом.
+    thumbnail = models.CharField(max_length=255, blank=True, default='',
+                                 editable=False)
+    thumbnail_width = models.PositiveIntegerField(null=True, editable=False)
+    thumbnail_height = models.PositiveIntegerField(null=True, editable=False)
+    # Готовые srcset вариантов картинки по ширине, см. posts.variants.
+    image_srcset = models.TextField(blank=True, default='', editable=False)
+    image_webp_srcset = models.TextField(blank=True, default='',
+                                         editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Индексы по возрастанию: SQLite читает их с конца и так отдаёт
+        # порядок (-pub_date, -id) без сортировки.
+        indexes = [
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_pub_date'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Счётчики AuthorStats обновляются сигналом в той же транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
@@ -50,6 +92,10 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['post', 'created'],
+                                name='comment_post_created')]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
@@ -62,3 +108,130 @@ class Follow(models.Model):
             fields=('user', 'author'),
             name='unique_list'
         )]
+        # Подписчики автора: раскладка постов по лентам и счётчики.
+        indexes = [models.Index(fields=['author', 'user'],
+                                name='follow_author_user')]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики автора для card_profile.html."""
+    author = models.OneToOneField(User, on_delete=models.CASCADE,
+                                  primary_key=True, related_name="stats")
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def bump(cls, author_id, field, delta):
+        # Разъехавшийся счётчик не уходит ниже нуля: иначе UPDATE
+        # нарушит CHECK у PositiveIntegerField и откатит удаление.
+        value = Greatest(models.F(field) + delta, 0)
+        updated = cls.objects.filter(author_id=author_id).update(
+            **{field: value})
+        if not updated and delta > 0:
+            cls.objects.get_or_create(author_id=author_id)
+            cls.objects.filter(author_id=author_id).update(
+                **{field: value})
+
+    @classmethod
+    def for_author(cls, author):
+        """Счётчики автора; нули, если строки ещё нет."""
+        try:
+            return author.stats
+        except cls.DoesNotExist:
+            return cls(author=author)
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок: пост автора, на которого подписан user."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [models.UniqueConstraint(
+            fields=('user', 'post'),
+            name='unique_timeline_entry'
+        )]
+        indexes = [models.Index(
+            fields=['user', 'pub_date', 'post'],
+            name='timeline_user_pub_date_post'
+        )]
+
+
+class ImageVariant(models.Model):
+    """Уменьшенная копия картинки поста для srcset."""
+    JPEG = 'JPEG'
+    WEBP = 'WEBP'
+    FORMATS = ((JPEG, 'JPEG'), (WEBP, 'WebP'))
+
+    source = models.CharField(max_length=255, db_index=True)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=4, choices=FORMATS)
+    file = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['source', 'format', 'width']
+        constraints = [models.UniqueConstraint(
+            fields=('source', 'width', 'format'),
+            name='unique_image_variant'
+        )]
+
+
+class MediaFile(models.Model):
+    """Число постов, которые ссылаются на файл картинки."""
+    name = models.CharField(max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def acquire(cls, name, content=None):
+        """
+        Добавляет ссылку. content - загруженный файл: хранилище могло
+        не записать его, найдя такой же файл, который delete_unused
+        удалил до этой ссылки; тогда файл записывается заново.
+        """
+        if not is_hashed(name):
+            return
+        with transaction.atomic():
+            cls.objects.get_or_create(name=name)
+            cls.objects.filter(name=name).update(refs=models.F('refs') + 1)
+            # Строка уже заблокирована этой транзакцией, и delete_unused
+            # файл не тронет. Имя уже адрес содержимого, поэтому запись
+            # идёт мимо save(), которая посчитала бы адрес заново.
+            if content is not None and not post_image_storage.exists(name):
+                post_image_storage._save(name, content)
+
+    @classmethod
+    def release(cls, name):
+        """Снимает ссылку; файл без ссылок удаляется после фиксации."""
+        if not is_hashed(name):
+            return
+        cls.objects.filter(name=name, refs__gt=0).update(
+            refs=models.F('refs') - 1)
+        transaction.on_commit(lambda: cls.delete_unused(name))
+
+    @classmethod
+    def delete_unused(cls, name, remove=None):
+        """
+        Удаляет файл, если на него не ссылается ни одна строка с refs > 0,
+        вместе со строкой refs=0. remove убирает файл вместо удаления из
+        хранилища. Возвращает True, если файл убран.
+        """
+        # Удаление строки, проверка ссылок и файла - в одной транзакции.
+        # DELETE первым берёт блокировку (в SQLite - всей базы, даже без
+        # подходящих строк), так что acquire() ждёт, пока файл удалится.
+        with transaction.atomic():
+            cls.objects.filter(name=name, refs=0).delete()
+            if cls.objects.select_for_update().filter(name=name).exists():
+                return False
+            (remove or post_image_storage.delete)(name)
+        return True
@@ -0,0 +1,167 @@
+import hashlib
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .caching import get_or_recompute
+
+# Границы INTEGER в SQLite: больший pk драйвер не передаёт в базу.
+PK_MIN, PK_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def encode_cursor(number, item):
+    """Курсор: номер страницы, к которой он ведёт, и ключ (pub_date, id)."""
+    raw = '{}|{}|{}'.format(number, item.pub_date.isoformat(), item.pk)
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(cursor):
+    """
+    Возвращает (number, pub_date, pk) или None для битого курсора.
+    Наши курсоры всегда с часовым поясом, так что наивное время - тоже
+    битый курсор.
+    """
+    try:
+        number, pub_date, pk = force_str(
+            urlsafe_base64_decode(cursor)).split('|')
+        number, pub_date, pk = int(number), parse_datetime(pub_date), int(pk)
+    except (TypeError, ValueError):
+        return None
+    if (pub_date is None or timezone.is_naive(pub_date)
+            or not PK_MIN <= pk <= PK_MAX):
+        return None
+    return max(number, 1), pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """
+    Постраничная навигация по ключу (pub_date, id).
+
+    Страница выбирается условием по ключу и LIMIT, без COUNT(*) и OFFSET.
+    Старые ссылки ?page=N обслуживаются через OFFSET, но только до
+    settings.PAGINATOR_MAX_OFFSET_PAGE. Свойство count по-прежнему
+    доступно, но считается только при явном обращении.
+    """
+
+    def __init__(self, object_list, per_page, max_offset_page=None):
+        object_list = object_list.order_by('-pub_date', '-pk')
+        super().__init__(object_list, per_page)
+        if max_offset_page is None:
+            max_offset_page = settings.PAGINATOR_MAX_OFFSET_PAGE
+        self.max_offset_page = max_offset_page
+
+    def get_page(self, number=None, after=None, before=None):
+        return self.page_from_window(self.get_window(number, after, before))
+
+    def get_window(self, number=None, after=None, before=None):
+        """
+        Выборка одной страницы: (items, number, has_previous, has_next,
+        cursor). В отличие от Page её можно положить в кеш.
+        """
+        if after:
+            key = decode_cursor(after)
+            if key is not None:
+                return self._after_window(*key, cursor='after:' + after)
+        if before:
+            key = decode_cursor(before)
+            if key is not None:
+                return self._before_window(*key, cursor='before:' + before)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        number = min(max(number, 1), self.max_offset_page)
+        return self._offset_window(number)
+
+    def _offset_window(self, number):
+        bottom = (number - 1) * self.per_page
+        items = self._newest(bottom, self.per_page + 1)
+        if not items and number > 1:
+            return self._offset_window(1)
+        return (items[:self.per_page], number, number > 1,
+                len(items) > self.per_page, 'page:{}'.format(number))
+
+    def _after_window(self, number, pub_date, pk, cursor):
+        items = self._older(pub_date, pk, self.per_page + 1)
+        return (items[:self.per_page], max(number, 2), True,
+                len(items) > self.per_page, cursor)
+
+    def _before_window(self, number, pub_date, pk, cursor):
+        items = self._newer(pub_date, pk, self.per_page + 1)
+        if not items:
+            return self._offset_window(1)
+        has_previous = len(items) > self.per_page
+        items = items[:self.per_page]
+        items.reverse()
+        number = max(number, 2) if has_previous else 1
+        # Следующая страница существует всегда: мы пришли с неё.
+        return items, number, has_previous, True, cursor
+
+    # Выборка строк вынесена в отдельные методы, чтобы наследники могли
+    # читать ленту не из object_list.
+
+    def _newest(self, offset, limit):
+        return list(self.object_list[offset:offset + limit])
+
+    def _older(self, pub_date, pk, limit):
+        """Записи старше ключа, от новых к старым."""
+        return list(self.object_list.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+        )[:limit])
+
+    def _newer(self, pub_date, pk, limit):
+        """Записи новее ключа, от старых к новым."""
+        return list(self.object_list.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+        ).order_by('pub_date', 'pk')[:limit])
+
+    def page_from_window(self, window):
+        items, number, has_previous, has_next, cursor = window
+        page = self._get_page(items, number, self)
+        # Page.has_next() сравнивает номер с num_pages, поэтому num_pages
+        # задаётся по факту, без подсчёта всей выборки.
+        self.num_pages = number + 1 if has_next else number
+        page.cursor = cursor
+        page.previous_cursor = (
+            encode_cursor(number - 1, items[0])
+            if has_previous and items else None)
+        page.next_cursor = (
+            encode_cursor(number + 1, items[-1])
+            if has_next and items else None)
+        return page
+
+
+def paginate(request, object_list, cache_key=None, hot_window=None,
+             paginator=None):
+    """
+    Страница ленты по параметрам запроса: after, before или page.
+
+    paginator - готовый наследник CursorPaginator, если страницы
+    выбираются не из object_list.
+
+    С cache_key выборка страницы кешируется через get_or_recompute;
+    ключ должен меняться вместе с содержимым ленты. hot_window(params,
+    per_page) может вернуть окно страницы из памяти процесса, тогда
+    ни кеш, ни база не нужны.
+    """
+    if paginator is None:
+        paginator = CursorPaginator(object_list, settings.COUNT_PAGINATOR)
+    params = [request.GET.get(name) for name in ('page', 'after', 'before')]
+    if hot_window is not None:
+        window = hot_window(params, paginator.per_page)
+        if window is not None:
+            return paginator.page_from_window(window)
+    if cache_key is None:
+        return paginator.get_page(*params)
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    window = get_or_recompute(
+        'feed-page:{}:{}'.format(cache_key, digest),
+        lambda: paginator.get_window(*params),
+        settings.FRAGMENT_CACHE_TIMEOUT,
+    )
+    return paginator.page_from_window(window)
@@ -0,0 +1,108 @@
+"""
+Полнотекстовый поиск по постам.
+
+Таблица FTS5 posts_post_search индексирует Post.text, не храня копию
+текста (content='posts_post'). Триггеры обновляют её при любой записи
+в posts_post, в том числе через update() и сырой SQL. DDL таблицы и
+триггеров (CREATE, DROP) нужен командам; миграция 0017_post_search
+выполняет свою замороженную копию.
+Результаты сортируются по BM25. На других СУБД поиск откатывается на
+icontains.
+"""
+import re
+
+from django.db import connection, connections, router
+
+from .models import Post
+
+TABLE = 'posts_post_search'
+REBUILD = f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')"
+OPTIMIZE = f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')"
+
+INSERT_TRIGGER = f'{TABLE}_insert'
+# remove_diacritics 2: «ё» совпадает с «е».
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')")
+CREATE_INSERT_TRIGGER = (
+    f"CREATE TRIGGER {INSERT_TRIGGER} AFTER INSERT ON posts_post "
+    "BEGIN "
+    f"INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END")
+CREATE = (
+    CREATE_TABLE,
+    CREATE_INSERT_TRIGGER,
+    f"CREATE TRIGGER {TABLE}_delete AFTER DELETE ON posts_post "
+    "BEGIN "
+    f"INSERT INTO {TABLE}({TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    f"CREATE TRIGGER {TABLE}_update AFTER UPDATE OF text "
+    "ON posts_post BEGIN "
+    f"INSERT INTO {TABLE}({TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    REBUILD,
+)
+DROP = (
+    f'DROP TRIGGER IF EXISTS {INSERT_TRIGGER}',
+    f'DROP TRIGGER IF EXISTS {TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {TABLE}_update',
+    f'DROP TABLE IF EXISTS {TABLE}',
+)
+
+WORD = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """
+    Запрос посетителя как выражение MATCH: все слова должны найтись,
+    каждое как префикс («пост» найдёт «посты»). Синтаксис FTS5 из
+    запроса не пропускается. Пустой запрос даёт None.
+    """
+    words = WORD.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def uses_fts():
+    return connection.vendor == 'sqlite'
+
+
+def filter_matching(queryset, expression):
+    """Оставляет в выборке постов только подходящие под выражение."""
+    return queryset.extra(
+        where=[f'posts_post.id IN (SELECT rowid FROM {TABLE} '
+               f'WHERE {TABLE} MATCH %s)'],
+        params=[expression])
+
+
+def ranked_ids(query, limit):
+    """
+    id не более чем limit постов по запросу, самые релевантные первыми.
+    Сортирует сам FTS5 (столбец rank - это bm25), без JOIN с постами.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    if not uses_fts():
+        posts = Post.objects.all()
+        for word in WORD.findall(query):
+            posts = posts.filter(text__icontains=word)
+        return list(posts.order_by('-pub_date', '-pk')
+                    .values_list('pk', flat=True)[:limit])
+    using = router.db_for_read(Post)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+            f'ORDER BY rank, rowid DESC LIMIT %s', (expression, limit))
+        return [pk for pk, in cursor.fetchall()]
+
+
+def posts_by_ids(ids):
+    """Посты для ленты в порядке ids."""
+    posts = Post.objects.feed().in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,255 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.urls import reverse
+
+from . import hot_feed, timeline
+from .caching import (author_scope, bump_generation, card_scope,
+                      group_scope, index_scope, post_scopes)
+from .middleware import purge_paths
+from .models import (AuthorStats, Comment, Follow, Group, MediaFile, Post,
+                     User)
+
+
+def invalidate(scopes=(), paths=()):
+    """
+    Сбрасывает поколения scopes и кеш страниц paths после коммита. До
+    коммита другие запросы ещё читают старые строки и положили бы их в
+    кеш под новым поколением.
+    """
+    scopes, paths = list(scopes), list(paths)
+
+    def run():
+        bump_generation(*scopes)
+        purge_paths(*paths)
+    transaction.on_commit(run)
+
+
+def post_paths(post, group_ids=()):
+    """Пути страниц, на которых показан пост."""
+    username = post.author.username
+    group_ids = {post.group_id, *group_ids} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True) if group_ids else []
+    return [
+        reverse('index'),
+        reverse('profile', kwargs={'username': username}),
+        reverse('post', kwargs={'username': username, 'post_id': post.pk}),
+        *(reverse('group', kwargs={'slug': slug}) for slug in slugs),
+    ]
+
+
+def follow_paths(follow):
+    """Профили, в которых показаны счётчики подписок."""
+    usernames = User.objects.filter(
+        pk__in=(follow.user_id, follow.author_id)
+    ).values_list('username', flat=True)
+    return [reverse('profile', kwargs={'username': username})
+            for username in usernames]
+
+
+def update_hot_feed(post_pk, deleted=False):
+    """
+    Правит буфер главной после коммита: после отката в нём остался бы
+    несуществующий пост.
+    """
+    transaction.on_commit(partial(hot_feed.feed.update, post_pk, deleted))
+
+
+def post_pages(posts, usernames=()):
+    """
+    Пути страниц постов и id их авторов. Пути строятся и для прежних
+    имён usernames, если автор переименован.
+    """
+    paths, author_ids = set(), set()
+    for pk, author_id, username in posts.values_list(
+            'pk', 'author', 'author__username').iterator():
+        author_ids.add(author_id)
+        for name in {username, *usernames} - {None}:
+            paths.add(reverse('post', kwargs={'username': name,
+                                              'post_id': pk}))
+    return paths, author_ids
+
+
+def _loaded(instance, *names):
+    # Через __dict__, чтобы отложенные поля (only/defer) не дочитывались.
+    return tuple(instance.__dict__.get(name) for name in names)
+
+
+def _user_names(user):
+    return _loaded(user, 'username', 'first_name', 'last_name')
+
+
+def user_renamed(user, old_username):
+    """
+    Имя пользователя видно в постах всех лент, в профиле, на страницах
+    его постов и постов, которые он комментировал.
+    """
+    own_paths, _ = post_pages(Post.objects.filter(author=user),
+                              [old_username])
+    commented_paths, author_ids = post_pages(
+        Post.objects.filter(comments__author=user).distinct())
+    group_ids = set(Post.objects.filter(author=user).exclude(
+        group=None).order_by().values_list('group', flat=True))
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    invalidate([
+        index_scope(), author_scope(user.pk),
+        *(author_scope(author_id) for author_id in author_ids),
+        *(group_scope(group_id) for group_id in group_ids),
+    ], [
+        reverse('index'),
+        *(reverse('profile', kwargs={'username': username})
+          for username in {user.username, old_username} - {None}),
+        *(reverse('group', kwargs={'slug': slug}) for slug in slugs),
+        *own_paths, *commented_paths,
+    ])
+
+
+def group_changed(group_id, slugs, paths, author_ids):
+    """
+    Название группы видно в постах главной, профилей и страниц постов;
+    paths и author_ids собираются заранее через post_pages().
+    """
+    usernames = User.objects.filter(pk__in=author_ids).values_list(
+        'username', flat=True)
+    invalidate([
+        index_scope(), group_scope(group_id),
+        *(author_scope(author_id) for author_id in author_ids),
+    ], [
+        reverse('index'),
+        *(reverse('group', kwargs={'slug': slug}) for slug in slugs),
+        *(reverse('profile', kwargs={'username': username})
+          for username in usernames),
+        *paths,
+    ])
+
+
+@receiver(post_init, sender=User)
+def remember_names(sender, instance, **kwargs):
+    instance._loaded_names = _user_names(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        AuthorStats.objects.get_or_create(author=instance)
+    else:
+        invalidate([card_scope(instance.pk)])
+        # save() вызывается и при каждом входе (last_login), поэтому
+        # ленты сбрасываются, только если имя правда поменялось.
+        if _user_names(instance) != instance._loaded_names:
+            user_renamed(instance, instance._loaded_names[0])
+    instance._loaded_names = _user_names(instance)
+
+
+@receiver(post_init, sender=Group)
+def remember_title(sender, instance, **kwargs):
+    instance._loaded_title = _loaded(instance, 'title', 'slug')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate([group_scope(instance.pk)])
+    title = _loaded(instance, 'title', 'slug')
+    if not created and title != instance._loaded_title:
+        old_slug = instance._loaded_title[1]
+        group_changed(instance.pk, {instance.slug, old_slug} - {None},
+                      *post_pages(Post.objects.filter(group=instance)))
+    elif not created:
+        invalidate(paths=[reverse('group', kwargs={'slug': instance.slug})])
+    instance._loaded_title = title
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Посты отвязываются от группы через SET_NULL без сигналов, поэтому
+    # затронутые страницы собираются до удаления.
+    instance._affected = post_pages(Post.objects.filter(group=instance))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    group_changed(instance.pk, {instance.slug},
+                  *getattr(instance, '_affected', ((), ())))
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = instance.image.name
+
+
+@receiver(pre_save, sender=Post)
+def reset_thumbnail(sender, instance, raw=False, **kwargs):
+    # Миниатюра и srcset в строке относятся к прежней картинке.
+    if not raw and instance.image.name != instance._loaded_image:
+        instance.thumbnail = ''
+        instance.thumbnail_width = instance.thumbnail_height = None
+        instance.image_srcset = instance.image_webp_srcset = ''
+
+
+@receiver(pre_save, sender=Post)
+def remember_upload(sender, instance, **kwargs):
+    # После сохранения поля FieldFile заменяется именем файла, а
+    # загрузка нужна MediaFile.acquire().
+    image = instance.image
+    instance._upload = None if image._committed else image.file
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        AuthorStats.bump(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+    if instance.image.name != instance._loaded_image:
+        MediaFile.acquire(instance.image.name, instance._upload)
+        MediaFile.release(instance._loaded_image)
+    invalidate(post_scopes(instance, [instance._loaded_group_id]),
+               post_paths(instance, [instance._loaded_group_id]))
+    update_hot_feed(instance.pk)
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    AuthorStats.bump(instance.author_id, 'posts_count', -1)
+    MediaFile.release(instance.image.name)
+    invalidate(post_scopes(instance), post_paths(instance))
+    update_hot_feed(instance.pk, deleted=True)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance.post_id is not None:
+        invalidate(post_scopes(instance.post), post_paths(instance.post))
+        update_hot_feed(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.bump(instance.author_id, 'followers_count', 1)
+        AuthorStats.bump(instance.user_id, 'following_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        invalidate([card_scope(instance.user_id),
+                    card_scope(instance.author_id)], follow_paths(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    AuthorStats.bump(instance.author_id, 'followers_count', -1)
+    AuthorStats.bump(instance.user_id, 'following_count', -1)
+    timeline.trim(instance.user_id, instance.author_id)
+    invalidate([card_scope(instance.user_id),
+                card_scope(instance.author_id)], follow_paths(instance))
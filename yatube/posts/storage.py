@@ -0,0 +1,97 @@
+"""
+Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется SHA-256 своего содержимого: posts/ab/ab12…ef.jpg.
+Одинаковые загрузки попадают в один файл, а раз содержимое по имени
+не меняется никогда, URL можно кешировать навсегда. Сколько постов
+ссылается на файл, считает модель MediaFile.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 1024 * 1024
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def content_hash(content):
+    """SHA-256 файла; файл читается кусками и перематывается в начало."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    directory, filename = os.path.split(name)
+    extension = os.path.splitext(filename)[1].lower()
+    return os.path.join(directory, digest[:2], digest + extension)
+
+
+def walk_files(storage, directory):
+    """
+    Имена файлов каталога хранилища. Обход через os.scandir со стеком
+    каталогов, без списков файлов в памяти.
+    """
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(storage.path(current))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = '/'.join((current, entry.name))
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    yield name
+
+
+def is_hashed(name):
+    return bool(name) and HASHED_NAME.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, content_hash(content))
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Запись во временный файл и атомарная подмена: параллельная
+        # загрузка того же содержимого даст тот же файл.
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    output.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+post_image_storage = ContentAddressedStorage()
@@ -0,0 +1,36 @@
+"""
+Случайные, но воспроизводимые данные для нагрузочных замеров.
+
+Все функции берут генератор random.Random, поэтому одинаковый seed
+даёт одинаковые данные.
+"""
+import itertools
+
+SYLLABLES = ('ка', 'то', 'ми', 'ро', 'на', 'ле', 'су', 'ва', 'до', 'пи',
+             'ло', 'ре', 'ны', 'зо', 'гу', 'бе', 'ча', 'шу', 'фи', 'жа')
+
+
+def vocabulary(size, rng):
+    """size разных слов из слогов в случайном порядке."""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    # Порядок обхода множества зависит от PYTHONHASHSEED, поэтому
+    # перемешивается отсортированный список.
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+
+def zipf_weights(size, exponent=1.0):
+    """
+    Накопленные веса закона Ципфа для random.choices(cum_weights=...):
+    первый элемент выбирается чаще всех, хвост - редко.
+    """
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def text(rng, words, weights, low=5, high=40):
+    return ' '.join(rng.choices(words, cum_weights=weights,
+                                k=rng.randint(low, high)))
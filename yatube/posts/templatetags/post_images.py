@@ -0,0 +1,34 @@
+from django import template
+from django.conf import settings
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, name=thumbnails.ROW_GEOMETRY):
+    """
+    Миниатюра из settings.THUMBNAIL_GEOMETRIES или исходная картинка,
+    пока миниатюра рисуется в фоне.
+
+        {% post_thumbnail post "post" as im %}
+    """
+    return thumbnails.thumbnail_for(post, name)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, name=thumbnails.ROW_GEOMETRY):
+    """
+    Находит миниатюры для всех постов страницы одним обращением.
+
+        {% prefetch_thumbnails page "post" %}
+    """
+    thumbnails.prefetch(posts, name)
+    return ''
+
+
+@register.simple_tag
+def image_sizes():
+    """Значение атрибута sizes для srcset картинки поста."""
+    return settings.IMAGE_VARIANT_SIZES
@@ -0,0 +1,52 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from yatube import metrics
+
+from ..caching import get_or_recompute
+
+register = template.Library()
+
+
+class SWRCacheNode(CacheNode):
+    def render(self, context):
+        try:
+            timeout = int(self.expire_time_var.resolve(context))
+        except (template.VariableDoesNotExist, ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                '"swrcache" tag got an invalid timeout: %r'
+                % self.expire_time_var.var)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        cache_key = make_template_fragment_key(self.fragment_name, vary_on)
+        computed = []
+
+        def compute():
+            computed.append(True)
+            return self.nodelist.render(context)
+
+        content = get_or_recompute(cache_key, compute, timeout)
+        metrics.inc('yatube_fragment_cache_total',
+                    fragment=self.fragment_name,
+                    result='miss' if computed else 'hit')
+        return content
+
+
+@register.tag('swrcache')
+def do_swrcache(parser, token):
+    """
+    Как {% cache %}, но с пересчётом в одном процессе и отдачей
+    устаревшей копии на время пересчёта.
+
+        {% swrcache [timeout] [fragment_name] [var1] [var2] .. %}
+    """
+    nodelist = parser.parse(('endswrcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            "'%r' tag requires at least 2 arguments." % tokens[0])
+    return SWRCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(t) for t in tokens[3:]], None,
+    )
@@ -0,0 +1,46 @@
+from django.db import connection
+from django.test import TestCase
+
+from ..management.commands.bench_urls import (QueryStats, regressions,
+                                              summary)
+from ..models import Post
+
+
+def result(p95_ms, queries, endpoint='index'):
+    return {'size': 1000, 'endpoint': endpoint, 'role': 'user',
+            'p95_ms': p95_ms, 'queries': queries}
+
+
+class BenchUrlsTests(TestCase):
+    def test_query_stats_counts_queries(self):
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            Post.objects.count()
+            Post.objects.exists()
+        self.assertEqual(stats.count, 2)
+        self.assertGreater(stats.seconds, 0)
+
+    def test_summary(self):
+        samples = [(number / 1000, 200, 3, 0.001) for number in range(100)]
+        report = summary(1000, 'index', 'user', samples, [2048, 1024, 4096])
+        self.assertEqual(report['p50_ms'], 50)
+        self.assertEqual(report['p95_ms'], 95)
+        self.assertEqual(report['p99_ms'], 99)
+        self.assertEqual(report['queries'], 3)
+        self.assertEqual(report['sql_ms'], 1)
+        self.assertEqual(report['alloc_kb'], 2)
+        self.assertEqual(report['status'], [200])
+
+    def test_regressions(self):
+        baseline = {'results': [result(10, 3), result(10, 3, 'group')]}
+        current = {'results': [result(13, 4), result(10.5, 3, 'group'),
+                               result(99, 9, 'post')]}
+        self.assertEqual(regressions(baseline, current, 0.2), [
+            '1000 index (user): p95 10 -> 13 мс',
+            '1000 index (user): запросов 3 -> 4',
+        ])
+
+    def test_small_absolute_growth_is_noise(self):
+        baseline = {'results': [result(0.2, 0)]}
+        current = {'results': [result(0.9, 0)]}
+        self.assertEqual(regressions(baseline, current, 0.2), [])
@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from yatube import metrics
+from yatube.cache import SQLiteCache, TwoTierCache
+
+
+class CacheBackendTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def worker(self, **options):
+        """Отдельный экземпляр кеша, как в другом процессе gunicorn."""
+        options.setdefault('CHECK_INTERVAL', 0)
+        return TwoTierCache(self.location, {'OPTIONS': options})
+
+
+class SQLiteCacheTests(CacheBackendTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = SQLiteCache(self.location, {})
+
+    def test_basic_operations(self):
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.cache.delete('key')
+        self.assertTrue(self.cache.add('key', 'other'))
+        self.assertEqual(self.cache.get_many(['key', 'none']),
+                         {'key': 'other'})
+
+    def test_expired_values_are_replaced_by_add(self):
+        self.cache.set('key', 'old', timeout=-1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+
+    def test_incr_is_shared(self):
+        other = SQLiteCache(self.location, {})
+        self.cache.set('counter', 1)
+        self.assertEqual(other.incr('counter'), 2)
+        self.assertEqual(self.cache.incr('counter', 5), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+
+class TwoTierCacheTests(CacheBackendTestCase):
+    def test_second_read_served_from_l1(self):
+        cache = self.worker(CHECK_INTERVAL=60)
+        cache.set('key', 'value')
+        other = self.worker()
+        metrics.registry.clear()
+        self.assertEqual(other.get('key'), 'value')
+        self.assertEqual(other.get('key'), 'value')
+        self.assertIsNone(other.get('missing'))
+        self.assertEqual(metrics.registry.collect(), {
+            ('yatube_cache_l1_total', 'result="hit"', ''): 1,
+            ('yatube_cache_l1_total', 'result="miss"', ''): 2,
+            ('yatube_cache_l2_total', 'result="hit"', ''): 1,
+            ('yatube_cache_l2_total', 'result="miss"', ''): 1,
+        })
+
+    def test_write_propagates_to_other_worker(self):
+        """Изменение в одном процессе видно в L1 другого."""
+        first, second = self.worker(), self.worker()
+        first.set('key', 'old')
+        self.assertEqual(second.get('key'), 'old')
+        first.set('key', 'new')
+        self.assertEqual(second.get('key'), 'new')
+        first.set('n', 1)
+        second.get('n')
+        first.incr('n')
+        self.assertEqual(second.get('n'), 2)
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+
+    def test_unrelated_buckets_survive_write(self):
+        first, second = self.worker(), self.worker()
+        self.assertNotEqual(second._bucket('a', None)[1],
+                            second._bucket('b', None)[1])
+        second.get_many(['a', 'b'])
+        first.set('a', 1)
+        first.set('b', 2)
+        self.assertEqual(second.get_many(['a', 'b']), {'a': 1, 'b': 2})
+        metrics.registry.clear()
+        first.set('a', 10)
+        self.assertEqual(second.get('b'), 2)
+        self.assertEqual(metrics.registry.collect(), {
+            ('yatube_cache_l1_total', 'result="hit"', ''): 1})
+
+    def test_read_racing_with_invalidation_is_not_cached(self):
+        """Значение, сброшенное во время чтения из L2, не остаётся в L1."""
+        first, second = self.worker(), self.worker()
+        first.set('key', 'old')
+        read = second._l2.get_many_expiring
+
+        def racing_read(keys, version=None):
+            found = read(keys, version=version)
+            if keys != ['key']:
+                return found
+            second._l2.get_many_expiring = read
+            # Пока поток читал L2, ключ переписали, а другой поток
+            # этого процесса уже сверил версии корзин.
+            first.set('key', 'new')
+            with second._lock:
+                second._sync()
+            return found
+
+        second._l2.get_many_expiring = racing_read
+        self.assertEqual(second.get('key'), 'old')
+        self.assertEqual(second.get('key'), 'new')
+
+    def test_l1_expires_with_l2(self):
+        first, second = self.worker(), self.worker()
+        first.set('key', 'value', timeout=2)
+        second.get('key')
+        expires, _, _ = second._l1[second._bucket('key', None)[0]]
+        self.assertLessEqual(expires - time.monotonic(), 2)
+
+    def test_clear_in_one_worker_drops_l1_of_others(self):
+        first, second = self.worker(), self.worker()
+        first.set('key', 'value')
+        second.get('key')
+        first.clear()
+        self.assertIsNone(second.get('key'))
+
+    def test_l1_is_bounded(self):
+        cache = self.worker(L1_MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(len(cache._l1), 2)
+        self.assertEqual(cache.get('a'), 'a')
@@ -0,0 +1,233 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from yatube import metrics
+
+from ..caching import LOCK_KEY, get_generation, get_or_recompute, index_scope
+from ..middleware import page_cache_stats
+from ..models import Comment, Follow, Group, Post, User
+from .utils import on_commit_callbacks
+
+
+class GetOrRecomputeTests(TestCase):
+    key = 'test-key'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fresh_value_is_not_recomputed(self):
+        compute = mock.Mock(return_value='value')
+        get_or_recompute(self.key, compute, 60)
+        self.assertEqual(get_or_recompute(self.key, compute, 60), 'value')
+        compute.assert_called_once()
+
+    def test_stale_value_served_while_other_worker_rebuilds(self):
+        """Пока пересчёт занят другим процессом, отдаётся старая копия."""
+        get_or_recompute(self.key, lambda: 'old', 0)
+        cache.add(LOCK_KEY.format(self.key), 1)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(get_or_recompute(self.key, compute, 60), 'old')
+        compute.assert_not_called()
+
+    def test_stale_value_refreshed_by_lock_holder(self):
+        get_or_recompute(self.key, lambda: 'old', 0)
+        self.assertEqual(get_or_recompute(self.key, lambda: 'new', 60), 'new')
+        self.assertIsNone(cache.get(LOCK_KEY.format(self.key)))
+
+    def test_database_error_serves_stale(self):
+        """Ошибка базы при пересчёте не ломает страницу."""
+        get_or_recompute(self.key, lambda: 'old', 0)
+        compute = mock.Mock(side_effect=DatabaseError)
+        self.assertEqual(get_or_recompute(self.key, compute, 60), 'old')
+
+    def test_database_error_without_stale_value_raises(self):
+        compute = mock.Mock(side_effect=DatabaseError)
+        with self.assertRaises(DatabaseError):
+            get_or_recompute(self.key, compute, 60)
+
+    def test_hard_timeout_drops_value(self):
+        with mock.patch('posts.caching.cache') as mocked_cache:
+            mocked_cache.get.return_value = None
+            mocked_cache.add.return_value = True
+            get_or_recompute(self.key, lambda: 'value', 10, 5)
+        args = mocked_cache.set.call_args[0]
+        self.assertEqual(args[0], self.key)
+        self.assertEqual(args[2], 15)
+
+
+class FeedPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Anonim')
+        Post.objects.create(text='Text_test', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_cached_feed_page_skips_queries(self):
+        """Повторный запрос ленты не обращается к таблице постов."""
+        self.authorized_client.get(reverse('index'))
+        # Остаются только запросы сессии и пользователя.
+        with self.assertNumQueries(2):
+            response = self.authorized_client.get(reverse('index'))
+        self.assertEqual(len(response.context['page']), 1)
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Anonim')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Group', slug='group')
+        cls.post = Post.objects.create(
+            text='Text_test', author=cls.author, group=cls.group)
+        cls.urls = {
+            'index': reverse('index'),
+            'group': reverse('group', kwargs={'slug': cls.group.slug}),
+            'profile': reverse(
+                'profile', kwargs={'username': cls.author.username}),
+            'post': reverse('post', kwargs={
+                'username': cls.author.username, 'post_id': cls.post.pk}),
+        }
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.guest_client = Client()
+
+    def assertHit(self, url):
+        response = self.guest_client.get(url)
+        self.assertEqual(response.get('X-Page-Cache'), 'HIT')
+        return response
+
+    def assertMiss(self, url):
+        response = self.guest_client.get(url)
+        self.assertIsNone(response.get('X-Page-Cache'))
+        return response
+
+    def test_anonymous_pages_cached(self):
+        for url in self.urls.values():
+            with self.subTest(url=url):
+                self.assertMiss(url)
+                with self.assertNumQueries(0):
+                    self.assertHit(url)
+        self.assertEqual(page_cache_stats(), {'hits': 4, 'misses': 4})
+
+    def test_query_string_is_part_of_key(self):
+        self.assertMiss(self.urls['index'])
+        self.assertMiss(self.urls['index'] + '?page=2')
+        self.assertHit(self.urls['index'] + '?page=2')
+
+    def test_logged_in_user_bypasses_cache(self):
+        client = Client()
+        client.force_login(self.reader)
+        client.get(self.urls['index'])
+        response = client.get(self.urls['index'])
+        self.assertIsNone(response.get('X-Page-Cache'))
+        self.assertEqual(page_cache_stats(), {'hits': 0, 'misses': 0})
+
+    def test_new_post_purges_affected_pages(self):
+        """Новый пост сбрасывает главную, группу и профиль автора."""
+        for url in self.urls.values():
+            self.guest_client.get(url)
+        with on_commit_callbacks():
+            Post.objects.create(
+                text='Text_fresh', author=self.author, group=self.group)
+        for name in ('index', 'group', 'profile'):
+            with self.subTest(page=name):
+                response = self.assertMiss(self.urls[name])
+                self.assertContains(response, 'Text_fresh')
+        self.assertHit(self.urls['post'])
+
+    def test_comment_purges_post_page(self):
+        self.guest_client.get(self.urls['post'])
+        with on_commit_callbacks():
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Comment_fresh')
+        self.assertContains(self.assertMiss(self.urls['post']),
+                            'Comment_fresh')
+
+    def test_follow_purges_profiles(self):
+        self.guest_client.get(self.urls['profile'])
+        with on_commit_callbacks():
+            Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.assertMiss(self.urls['profile']),
+                            'Подписчиков: 1')
+
+    def test_group_rename_purges_feeds(self):
+        """Новое название группы видно во всех лентах и на посте."""
+        for url in self.urls.values():
+            self.guest_client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Renamed'
+        with on_commit_callbacks():
+            group.save()
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                self.assertContains(self.assertMiss(url), '#Renamed')
+
+    def test_group_delete_purges_feeds(self):
+        for name in ('index', 'profile', 'post'):
+            self.guest_client.get(self.urls[name])
+        with on_commit_callbacks():
+            Group.objects.filter(pk=self.group.pk).delete()
+        for name in ('index', 'profile', 'post'):
+            with self.subTest(page=name):
+                self.assertNotContains(self.assertMiss(self.urls[name]),
+                                       '#Group')
+
+    def test_username_change_purges_feeds(self):
+        self.guest_client.get(self.urls['index'])
+        self.guest_client.get(self.urls['group'])
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'Renamed'
+        with on_commit_callbacks():
+            author.save()
+        for name in ('index', 'group'):
+            with self.subTest(page=name):
+                self.assertContains(self.assertMiss(self.urls[name]),
+                                    '@Renamed')
+
+    def test_login_does_not_purge_feeds(self):
+        self.guest_client.get(self.urls['index'])
+        with on_commit_callbacks():
+            Client().force_login(self.author)
+        self.assertHit(self.urls['index'])
+
+
+class InvalidateOnCommitTests(TransactionTestCase):
+    """Кеши сбрасываются только после коммита записи."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Anonim')
+        self.guest_client = Client()
+        self.guest_client.get(reverse('index'))
+        self.generation = get_generation(index_scope())
+
+    def test_nothing_bumped_until_commit(self):
+        with transaction.atomic():
+            Post.objects.create(text='Text_fresh', author=self.author)
+            self.assertEqual(get_generation(index_scope()), self.generation)
+            # Читатель посреди транзакции получает старую страницу из кеша
+            # и ничего не кладёт под новое поколение.
+            response = self.guest_client.get(reverse('index'))
+            self.assertEqual(response.get('X-Page-Cache'), 'HIT')
+        self.assertNotEqual(get_generation(index_scope()), self.generation)
+        response = self.guest_client.get(reverse('index'))
+        self.assertIsNone(response.get('X-Page-Cache'))
+        self.assertContains(response, 'Text_fresh')
+
+    def test_rollback_bumps_nothing(self):
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            Post.objects.create(text='Text_fresh', author=self.author)
+            raise DatabaseError
+        self.assertEqual(get_generation(index_scope()), self.generation)
@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from .utils import on_commit_callbacks
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Anonim')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Group', slug='group')
+        cls.post = Post.objects.create(
+            text='Text_test', author=cls.author, group=cls.group)
+        cls.urls = (
+            reverse('index'),
+            reverse('group', kwargs={'slug': cls.group.slug}),
+            reverse('profile', kwargs={'username': cls.author.username}),
+            reverse('post', kwargs={
+                'username': cls.author.username, 'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_return_304(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                # Первый ответ страницы поста ставит cookie CSRF,
+                # которое входит в ETag.
+                self.client.get(url)
+                etag = self.client.get(url)['ETag']
+                # Только сессия, пользователь и поиск объекта страницы.
+                with self.assertNumQueries(2 if url == self.urls[0] else 3):
+                    response = self.revalidate(url, etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_etag(self):
+        """Пост, комментарий и подписка меняют ETag своих страниц."""
+        changes = {
+            self.urls[0]: lambda: Post.objects.create(
+                text='new', author=self.author),
+            self.urls[1]: lambda: Group.objects.filter(
+                pk=self.group.pk).first().save(),
+            self.urls[2]: lambda: Follow.objects.create(
+                user=self.reader, author=self.author),
+            self.urls[3]: lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='comment'),
+        }
+        for url, change in changes.items():
+            with self.subTest(url=url):
+                self.client.get(url)
+                etag = self.client.get(url)['ETag']
+                self.assertEqual(self.revalidate(url, etag).status_code, 304)
+                with on_commit_callbacks():
+                    change()
+                self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        etag = self.client.get(self.urls[0])['ETag']
+        author_client = Client()
+        author_client.force_login(self.author)
+        response = author_client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_objects_still_404(self):
+        url = reverse('profile', kwargs={'username': 'nobody'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_cached_anonymous_page_revalidates(self):
+        guest_client = Client()
+        etag = guest_client.get(self.urls[0])['ETag']
+        response = guest_client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
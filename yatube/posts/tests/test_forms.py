@@ -1,12 +1,15 @@
+import hashlib
 import shutil
 import tempfile
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Group, Post, User
+from ..storage import hashed_name
 
 
 TEMP_MEDIA = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -36,6 +39,7 @@ class TestPostForm(TestCase):
         shutil.rmtree(TEMP_MEDIA, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.author)
 
@@ -67,7 +71,8 @@ class TestPostForm(TestCase):
         self.assertTrue(Post.objects.filter(
             text=form_data['text'],
             group=self.group,
-            image='posts/small.gif'
+            image=hashed_name(
+                'posts/small.gif', hashlib.sha256(small_gif).hexdigest())
         ).exists()
         )
         self.assertTrue(response.context['page'][0].image.name, uploaded.name)
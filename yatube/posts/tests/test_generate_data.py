@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+
+from .. import timeline
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+from ..search import ranked_ids
+
+
+def generate(**options):
+    options.setdefault('users', 30)
+    options.setdefault('groups', 3)
+    options.setdefault('posts', 200)
+    options.setdefault('comments', 300)
+    options.setdefault('follows', 100)
+    options.setdefault('chunk_size', 64)
+    call_command('generate_data', stdout=StringIO(), **options)
+
+
+class GenerateDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate()
+
+    def test_exact_totals(self):
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 100)
+
+    def test_author_stats_match_data(self):
+        out = StringIO()
+        call_command('reconcile_author_stats', stdout=out)
+        self.assertIn('исправлено: 0', out.getvalue())
+
+    def test_timelines_match_fan_out(self):
+        """Ленты те же, что собрал бы сам timeline."""
+        for user in User.objects.filter(following__isnull=False)[:3]:
+            before = set(TimelineEntry.objects.filter(
+                user=user).values_list('post', flat=True))
+            timeline.rebuild(user)
+            self.assertEqual(before, set(TimelineEntry.objects.filter(
+                user=user).values_list('post', flat=True)))
+
+    def test_posts_are_searchable(self):
+        post = Post.objects.first()
+        self.assertIn(post.pk, ranked_ids(post.text, 10))
+
+    def test_same_seed_same_data(self):
+        texts = list(Post.objects.order_by('pk').values_list(
+            'text', 'pub_date'))
+        generate(prefix='again')
+        again = list(Post.objects.filter(
+            author__username__startswith='again').order_by('pk')
+            .values_list('text', 'pub_date'))
+        self.assertEqual(texts, again)
+
+    def test_existing_prefix_rejected(self):
+        with self.assertRaises(CommandError):
+            generate()
+
+
+class VocabularyTests(SimpleTestCase):
+    def vocabulary(self, hash_seed):
+        """Словарь из отдельного процесса со своим PYTHONHASHSEED."""
+        script = ('import random; from posts.synthetic import vocabulary; '
+                  'print(vocabulary(200, random.Random(1)))')
+        return subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR,
+            env={**os.environ, 'PYTHONHASHSEED': str(hash_seed)},
+            stdout=subprocess.PIPE, check=True).stdout
+
+    def test_same_seed_across_processes(self):
+        first = self.vocabulary(1)
+        for hash_seed in (2, 3):
+            with self.subTest(hash_seed=hash_seed):
+                self.assertEqual(self.vocabulary(hash_seed), first)
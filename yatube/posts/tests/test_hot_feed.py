@@ -0,0 +1,109 @@
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from ..caching import bump_generation, index_scope
+from ..hot_feed import feed
+from ..models import Comment, Post, User
+from .utils import on_commit_callbacks
+
+
+@override_settings(HOT_FEED_SIZE=15)
+class HotFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        for number in range(13):
+            Post.objects.create(text=f'text_{number}', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        feed.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def first_page(self):
+        return self.client.get(reverse('index')).context['page']
+
+    def test_first_page_served_from_memory(self):
+        """Тёплый буфер отдаёт страницу без запросов к постам."""
+        feed.warm_up()
+        # Остаются только запросы сессии и пользователя.
+        with self.assertNumQueries(2):
+            page = self.first_page()
+        self.assertEqual(page[0].text, 'text_12')
+        self.assertEqual(len(page), 10)
+        self.assertTrue(page.has_next())
+
+    def test_next_page_served_from_memory(self):
+        feed.warm_up()
+        cursor = self.first_page().next_cursor
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('index'), {'after': cursor})
+        self.assertEqual(len(response.context['page']), 3)
+        self.assertFalse(response.context['page'].has_next())
+
+    def test_naive_cursor_falls_back(self):
+        feed.warm_up()
+        cursor = urlsafe_base64_encode(
+            force_bytes(f'2|2020-01-01T00:00:00|{2 ** 40}'))
+        response = self.client.get(reverse('index'), {'after': cursor})
+        self.assertEqual(response.context['page'].number, 1)
+
+    def test_cold_buffer_loaded_from_database(self):
+        page = self.first_page()
+        self.assertEqual(page[0].text, 'text_12')
+        with self.assertNumQueries(2):
+            self.first_page()
+
+    def test_own_changes_applied_in_place(self):
+        feed.warm_up()
+        with on_commit_callbacks():
+            post = Post.objects.create(text='new', author=self.author)
+        with on_commit_callbacks():
+            Comment.objects.create(post=post, author=self.author, text='c')
+        with self.assertNumQueries(2):
+            page = self.first_page()
+        self.assertEqual(page[0], post)
+        self.assertEqual(page[0].comment_count, 1)
+
+        with on_commit_callbacks():
+            post.delete()
+        with self.assertNumQueries(2):
+            self.assertEqual(self.first_page()[0].text, 'text_12')
+
+    def test_foreign_change_makes_buffer_cold(self):
+        """Изменение в другом процессе видно по поколению ленты."""
+        feed.warm_up()
+        Post.objects.filter(text='text_12').update(text='changed')
+        bump_generation(index_scope())
+        self.assertEqual(self.first_page()[0].text, 'changed')
+
+    @override_settings(HOT_FEED_SIZE=5)
+    def test_page_beyond_buffer_falls_back(self):
+        feed.warm_up()
+        page = self.first_page()
+        self.assertEqual(len(page), 10)
+        self.assertTrue(page.has_next())
+
+
+@override_settings(HOT_FEED_SIZE=15)
+class HotFeedRollbackTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        feed.clear()
+        self.author = User.objects.create_user(username='Author')
+        Post.objects.create(text='text', author=self.author)
+
+    def test_rolled_back_post_not_shown(self):
+        feed.warm_up()
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            Post.objects.create(text='phantom', author=self.author)
+            raise DatabaseError
+        self.assertNotContains(self.client.get(reverse('index')), 'phantom')
@@ -0,0 +1,119 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..management.commands.collect_orphan_media import thumbnail_names
+from ..models import ImageVariant, MediaFile, Post, User
+from ..storage import post_image_storage
+
+TEMP_MEDIA = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x01\x00\x00'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA)
+class CollectOrphanMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(TEMP_MEDIA, ignore_errors=True)
+        self.post = Post.objects.create(
+            text='text', author=self.author,
+            image=SimpleUploadedFile('live.gif', SMALL_GIF))
+        live_thumbnail = next(thumbnail_names(self.post.image.name))
+        ImageVariant.objects.create(
+            source=self.post.image.name, width=320, height=113,
+            format=ImageVariant.JPEG, file='variants/live-320w.jpg',
+            size=1)
+        self.live = [self.post.image.name, 'variants/live-320w.jpg',
+                     live_thumbnail]
+        self.orphans = ['posts/00/' + '0' * 64 + '.gif',
+                        'posts/old.jpg',
+                        'variants/gone-320w.jpg',
+                        'cache/aa/bb/' + 'a' * 32 + '.jpg']
+        old = 0
+        for name in self.live + self.orphans:
+            path = post_image_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not os.path.exists(path):
+                with open(path, 'wb') as media_file:
+                    media_file.write(b'x' * 10)
+            os.utime(path, (old, old))
+
+    def exists(self, name):
+        return os.path.exists(post_image_storage.path(name))
+
+    def collect(self, *args):
+        out = io.StringIO()
+        call_command('collect_orphan_media', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_only_lists(self):
+        output = self.collect('--dry-run')
+        for name in self.orphans:
+            self.assertIn(name, output)
+            self.assertTrue(self.exists(name))
+        for name in self.live:
+            self.assertNotIn(name, output)
+
+    def test_orphans_deleted(self):
+        output = self.collect()
+        self.assertIn('удалено: 4', output)
+        for name in self.orphans:
+            self.assertFalse(self.exists(name), name)
+        for name in self.live:
+            self.assertTrue(self.exists(name), name)
+
+    def test_orphans_quarantined(self):
+        quarantine = os.path.join(TEMP_MEDIA, '..', 'quarantine-test')
+        self.addCleanup(shutil.rmtree, quarantine, True)
+        self.collect('--quarantine', quarantine)
+        for name in self.orphans:
+            self.assertFalse(self.exists(name))
+            self.assertTrue(os.path.exists(os.path.join(quarantine, name)))
+
+    def test_fresh_files_kept(self):
+        fresh = post_image_storage.path('posts/fresh.gif')
+        with open(fresh, 'wb') as media_file:
+            media_file.write(SMALL_GIF)
+        self.collect()
+        self.assertTrue(os.path.exists(fresh))
+
+    def test_lookups_batched(self):
+        """Живые файлы ищутся пачками, а не по одному."""
+        with self.assertNumQueries(4):
+            self.collect('--dry-run', '--batch-size', '500')
+
+    def test_referenced_image_kept(self):
+        """Картинку без постов, но со ссылкой в MediaFile не трогают."""
+        name = self.orphans[0]
+        MediaFile.objects.create(name=name, refs=1)
+        output = self.collect()
+        self.assertIn('удалено: 3', output)
+        self.assertTrue(self.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 1)
+
+    def test_unreferenced_media_row_removed(self):
+        name = self.orphans[0]
+        MediaFile.objects.create(name=name, refs=0)
+        self.collect()
+        self.assertFalse(self.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
@@ -0,0 +1,95 @@
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from yatube import metrics
+
+from ..models import Post, User
+
+
+@override_settings(METRICS_TOKEN='secret', METRICS_ALLOWED_IPS=[])
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        response = Client().get(reverse('metrics'),
+                                HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        text = self.scrape()
+        self.assertIn('yatube_requests_total{method="GET",status="200",'
+                      'view="index"} 2', text)
+        self.assertIn('yatube_request_duration_seconds_count'
+                      '{view="index"} 2', text)
+        self.assertIn('yatube_request_queries_bucket'
+                      '{view="index",le="+Inf"} 2', text)
+        self.assertIn('# TYPE yatube_request_sql_seconds histogram', text)
+        self.assertIn('yatube_template_render_seconds_count'
+                      '{template="index.html"} 2', text)
+
+    def test_fragment_cache_hits_and_misses(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        text = self.scrape()
+        self.assertIn('yatube_fragment_cache_total'
+                      '{fragment="index_page",result="miss"} 1', text)
+        self.assertIn('yatube_fragment_cache_total'
+                      '{fragment="index_page",result="hit"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics.observe('yatube_request_queries', 3, view='index')
+        text = metrics.render(metrics.registry.collect())
+        self.assertIn('yatube_request_queries_bucket'
+                      '{view="index",le="2"} 0', text)
+        self.assertIn('yatube_request_queries_bucket'
+                      '{view="index",le="5"} 1', text)
+        self.assertIn('yatube_request_queries_bucket'
+                      '{view="index",le="100"} 1', text)
+        self.assertIn('yatube_request_queries_sum{view="index"} 3', text)
+
+    def test_hidden_without_token(self):
+        """Локальный адрес сам по себе доступа не даёт."""
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(headers=headers):
+                response = Client().get(reverse('metrics'),
+                                        REMOTE_ADDR='127.0.0.1', **headers)
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN=None, METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_allowed_addresses(self):
+        response = Client().get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        response = Client().get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+
+class SharedStoreTests(TestCase):
+    def test_processes_share_counters(self):
+        """Счётчики разных процессов складываются в общем файле."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'metrics.sqlite3')
+        first, second = metrics.Registry(), metrics.Registry()
+        with override_settings(METRICS_PATH=path):
+            first.inc('yatube_page_cache_total', result='hit')
+            first.flush(force=True)
+            second.inc('yatube_page_cache_total', 2, result='hit')
+            self.assertEqual(
+                second.collect(),
+                {('yatube_page_cache_total', 'result="hit"', ''): 3})
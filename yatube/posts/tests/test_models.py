@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from ..models import Group, Post
+from ..models import AuthorStats, Follow, Group, Post
 
 User = get_user_model()
 
@@ -32,3 +35,51 @@ class PostGroupModelTest(TestCase):
         group = PostGroupModelTest.group
         expected_object_name = group.title
         self.assertEqual(expected_object_name, str(group))
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(author=user)
+
+    def test_post_counter(self):
+        """Счётчик записей следует за созданием и удалением поста."""
+        post = Post.objects.create(text='text', author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка меняет счётчики обеих сторон."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_counter_does_not_go_negative(self):
+        """Удаление при разъехавшемся нулевом счётчике не падает."""
+        post = Post.objects.create(text='text', author=self.author)
+        AuthorStats.objects.filter(author=self.author).update(posts_count=0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+
+    def test_reconcile_repairs_drift(self):
+        Post.objects.create(text='text', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(author=self.author).update(
+            posts_count=42, followers_count=0)
+        AuthorStats.objects.filter(author=self.reader).delete()
+        call_command('reconcile_author_stats', chunk_size=1,
+                     stdout=StringIO())
+        author_stats = self.stats(self.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Group', slug='group')
+        for number in range(13):
+            cls.post = Post.objects.create(
+                text=f'text_{number}', author=cls.author, group=cls.group)
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='comment')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+        # Сессия и пользователь дают два запроса на любой странице,
+        # группа, профиль и пост ещё один на ETag. Лента подписок читает
+        # популярных авторов, ключи страницы и сами посты.
+        cls.budgets = {
+            reverse('index'): 3,
+            reverse('group', kwargs={'slug': cls.group.slug}): 5,
+            reverse('profile', kwargs={'username': cls.author.username}): 6,
+            reverse('post', kwargs={
+                'username': cls.author.username,
+                'post_id': cls.post.id}): 5,
+            reverse('follow_index'): 5,
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_views_fit_query_budget(self):
+        for url, budget in self.budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    self.client.get(url)
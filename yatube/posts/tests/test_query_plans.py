@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import timeline
+from ..hot_feed import feed
+from ..models import Comment, Follow, Group, Post, User
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTests(TestCase):
+    """Главные запросы страниц идут по индексам и без сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Group', slug='group')
+        for number in range(3):
+            cls.post = Post.objects.create(
+                text=f'text_{number}', author=cls.author, group=cls.group)
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='comment')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        feed.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def main_plan(self, url, table):
+        """План первого запроса к table с ORDER BY на странице url."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if sql.startswith('SELECT') and f'FROM "{table}"' in sql and (
+                    'ORDER BY' in sql):
+                return query_plan(sql)
+        self.fail(f'{url}: нет запроса к {table}')
+
+    def assertUsesIndex(self, plan, index):
+        self.assertTrue(any(index in step for step in plan), plan)
+        self.assertFalse(
+            [step for step in plan if 'TEMP B-TREE FOR ORDER BY' in step],
+            plan)
+
+    def test_index_feed(self):
+        plan = self.main_plan(reverse('index'), 'posts_post')
+        self.assertUsesIndex(plan, 'posts_post_pub_date')
+
+    def test_group_feed(self):
+        plan = self.main_plan(
+            reverse('group', kwargs={'slug': self.group.slug}), 'posts_post')
+        self.assertUsesIndex(plan, 'post_group_pub_date')
+
+    def test_profile_feed(self):
+        plan = self.main_plan(
+            reverse('profile', kwargs={'username': self.author.username}),
+            'posts_post')
+        self.assertUsesIndex(plan, 'post_author_pub_date')
+
+    def test_post_comments(self):
+        plan = self.main_plan(
+            reverse('post', kwargs={'username': self.author.username,
+                                    'post_id': self.post.pk}),
+            'posts_comment')
+        self.assertUsesIndex(plan, 'comment_post_created')
+
+    def test_follow_feed_avoids_full_scans(self):
+        plan = self.main_plan(reverse('follow_index'), 'posts_timelineentry')
+        self.assertUsesIndex(plan, 'timeline_user_pub_date_post')
+        self.assertFalse(
+            [step for step in plan if step.startswith('SCAN')
+             or 'USE TEMP B-TREE' in step], plan)
+
+    def test_followers_lookup(self):
+        """Раскладка поста читает подписчиков из индекса по автору."""
+        with CaptureQueriesContext(connection) as queries:
+            timeline.fan_out(self.post)
+        sql = next(query['sql'] for query in queries.captured_queries
+                   if 'FROM "posts_follow"' in query['sql'])
+        self.assertUsesIndex(query_plan(sql), 'follow_author_user')
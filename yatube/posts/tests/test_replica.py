@@ -0,0 +1,150 @@
+import io
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+from unittest import mock
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.db import connections
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase)
+from django.urls import reverse
+
+from yatube.replica import (REPLICA_ALIAS, STICKY_KEY, PrimaryReplicaRouter,
+                            ReplicaMiddleware, read_alias, reads_from)
+
+from ..caching import get_generation, index_scope
+from ..models import Follow, Group, Post, User
+
+
+def with_replica(settings_dict=None):
+    return mock.patch.dict(connections.databases,
+                           {REPLICA_ALIAS: settings_dict or {}})
+
+
+class RouterTests(SimpleTestCase):
+    router = PrimaryReplicaRouter()
+
+    def test_reads_outside_requests_go_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_feed_reads_go_to_replica(self):
+        with reads_from(REPLICA_ALIAS):
+            self.assertEqual(self.router.db_for_read(Post), REPLICA_ALIAS)
+            self.assertEqual(self.router.db_for_read(Follow), REPLICA_ALIAS)
+            # Сессии и пользователи читаются с default.
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate(REPLICA_ALIAS, 'posts'))
+
+
+class MiddlewareTests(SimpleTestCase):
+    def alias_for(self, request):
+        seen = []
+
+        def view(request):
+            seen.append(read_alias())
+            return mock.Mock()
+
+        with with_replica():
+            ReplicaMiddleware(view)(request)
+        return seen[0]
+
+    def test_get_reads_from_replica(self):
+        request = RequestFactory().get('/')
+        self.assertEqual(self.alias_for(request), REPLICA_ALIAS)
+        self.assertEqual(read_alias(), 'default')
+
+    def test_post_reads_from_primary(self):
+        self.assertEqual(self.alias_for(RequestFactory().post('/')),
+                         'default')
+
+    def test_sticky_session_reads_from_primary(self):
+        request = RequestFactory().get('/')
+        request.COOKIES['sessionid'] = 'key'
+        request.session = {STICKY_KEY: float('inf')}
+        self.assertEqual(self.alias_for(request), 'default')
+        request.session = {STICKY_KEY: 0}
+        self.assertEqual(self.alias_for(request), REPLICA_ALIAS)
+
+    def test_without_replica_everything_on_primary(self):
+        seen = []
+        ReplicaMiddleware(lambda request: seen.append(read_alias()))(
+            RequestFactory().get('/'))
+        self.assertEqual(seen, ['default'])
+
+
+class StickyWritesTests(TestCase):
+    """После записи сессия автора читает с default."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer')
+        self.author = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def sticky(self):
+        session = SessionStore(self.client.session.session_key)
+        return STICKY_KEY in session
+
+    def test_views_that_write_stick(self):
+        post = Post.objects.create(text='text', author=self.author)
+        own = Post.objects.create(text='text', author=self.user)
+        writes = (
+            ('new_post', {}, {'text': 'new'}),
+            ('add_comment', {'username': 'author', 'post_id': post.pk},
+             {'text': 'comment'}),
+            ('post_edit', {'username': 'writer', 'post_id': own.pk},
+             {'text': 'edited'}),
+            ('profile_follow', {'username': 'author'}, None),
+            ('profile_unfollow', {'username': 'author'}, None),
+        )
+        for name, kwargs, data in writes:
+            with self.subTest(name=name):
+                self.client.logout()
+                self.client.force_login(self.user)
+                self.assertFalse(self.sticky())
+                url = reverse(name, kwargs=kwargs)
+                if data is None:
+                    self.client.get(url)
+                else:
+                    self.client.post(url, data)
+                self.assertTrue(self.sticky())
+
+    def test_redirect_without_write_does_not_stick(self):
+        """Редирект с чужого поста и отписка без подписки."""
+        post = Post.objects.create(text='text', author=self.author)
+        response = self.client.post(
+            reverse('post_edit', args=['author', post.pk]), {'text': 'x'})
+        self.assertRedirects(response, reverse('index'))
+        self.client.get(reverse('profile_unfollow', args=['author']))
+        self.assertFalse(self.sticky())
+
+    def test_invalid_form_does_not_stick(self):
+        self.client.post(reverse('new_post'), {'text': ''})
+        self.assertFalse(self.sticky())
+
+
+class SyncReplicaTests(TransactionTestCase):
+    # Backup API ждёт конца открытой транзакции TestCase.
+    def test_copies_database_and_resets_feeds(self):
+        Group.objects.create(title='Group', slug='group')
+        Post.objects.create(
+            text='text', author=User.objects.create_user(username='a'))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        name = os.path.join(directory.name, 'replica.sqlite3')
+        generation = get_generation(index_scope())
+        with with_replica({'ENGINE': 'django.db.backends.sqlite3',
+                           'NAME': name}):
+            call_command('sync_replica', stdout=io.StringIO())
+        with closing(sqlite3.connect(name)) as replica:
+            count, = replica.execute(
+                'SELECT COUNT(*) FROM posts_post').fetchone()
+        self.assertEqual(count, 1)
+        self.assertGreater(get_generation(index_scope()), generation)
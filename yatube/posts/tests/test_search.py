@@ -0,0 +1,81 @@
+import io
+
+from django.contrib.auth.models import User as AdminUser
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, User
+from ..search import TABLE, match_expression, posts_by_ids, ranked_ids
+
+
+class MatchExpressionTests(TestCase):
+    def test_words_become_quoted_prefixes(self):
+        self.assertEqual(match_expression('Ёжик  в тумане'),
+                         '"Ёжик"* "в"* "тумане"*')
+
+    def test_fts_syntax_is_not_passed_through(self):
+        self.assertEqual(match_expression('a" OR NEAR(b'),
+                         '"a"* "OR"* "NEAR"* "b"*')
+        self.assertIsNone(match_expression(' *"() '))
+
+
+def search_posts(query):
+    return posts_by_ids(ranked_ids(query, 100))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.rare = Post.objects.create(
+            text='Котики и собаки в café', author=cls.author)
+        cls.often = Post.objects.create(
+            text='Котики, котики, ещё раз котики', author=cls.author)
+        Post.objects.create(text='Про погоду', author=cls.author)
+
+    def test_ranked_by_bm25(self):
+        self.assertEqual(search_posts('котик'),
+                         [self.often, self.rare])
+
+    def test_all_words_required_and_diacritics_ignored(self):
+        self.assertEqual(search_posts('котики собак'), [self.rare])
+        self.assertEqual(search_posts('CAFE'), [self.rare])
+
+    def test_limit(self):
+        self.assertEqual(ranked_ids('котики', 1), [self.often.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        Post.objects.filter(pk=self.rare.pk).update(text='Только собаки')
+        self.assertEqual((search_posts('котики')), [self.often])
+        Post.objects.get(pk=self.often.pk).delete()
+        self.assertEqual((search_posts('котики')), [])
+        self.assertEqual((search_posts('собаки')), [self.rare])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLE}({TABLE}) "
+                           f"VALUES ('delete-all')")
+        self.assertEqual((search_posts('погоду')), [])
+        call_command('rebuild_search', stdout=io.StringIO())
+        self.assertEqual(len(search_posts('погоду')), 1)
+
+    def test_search_page(self):
+        response = Client().get(reverse('search'), {'q': 'котики'})
+        self.assertEqual(list(response.context['page']),
+                         [self.often, self.rare])
+        self.assertContains(response, 'ещё раз котики')
+
+        response = Client().get(reverse('search'), {'q': ''})
+        self.assertEqual(list(response.context['page']), [])
+
+    def test_admin_search_uses_index(self):
+        admin = AdminUser.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(reverse('admin:posts_post_changelist'),
+                              {'q': 'котики'})
+        self.assertEqual(set(response.context['cl'].result_list),
+                         {self.often, self.rare})
@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.signals import template_rendered
+from django.urls import reverse
+
+from yatube.slow_queries import (fingerprint, fingerprint_id,
+                                 install_wrapper, log_slow_queries)
+
+from ..models import Comment, Post, User
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_literals_and_in_lists_are_normalized(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x''y' AND b = 10\n"
+                        "  AND c IN (%s, %s, %s)"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)')
+        self.assertEqual(fingerprint('SELECT a FROM t WHERE id IN (%s)'),
+                         fingerprint('SELECT a FROM t WHERE id IN (1, 2)'))
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        Comment.objects.create(post=cls.post, author=cls.author, text='Да')
+
+    def entries(self, url):
+        with self.assertLogs('yatube.slow_queries') as logs:
+            Client().get(url)
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_query_attributed_to_view_and_template(self):
+        entries = self.entries(
+            reverse('post', args=[self.author.username, self.post.pk]))
+        self.assertTrue(all(entry['view'] == 'post' for entry in entries))
+        comments, = [entry for entry in entries
+                     if entry['template'] == 'posts/comments.html']
+        self.assertIsInstance(comments['line'], int)
+        self.assertTrue(comments['source'].startswith('posts/views.py:'))
+        self.assertEqual(comments['params'], [self.post.pk])
+        self.assertIn('posts_comment', ' '.join(comments['plan']))
+        self.assertEqual(comments['fingerprint'],
+                         fingerprint_id(fingerprint(comments['sql'])))
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_connection_opened_mid_request(self):
+        """Журнал не снимается вместе с обёрткой метрик запроса."""
+        wrappers = connection.execute_wrappers
+        self.addCleanup(setattr, connection, 'execute_wrappers',
+                        list(wrappers))
+        connection.execute_wrappers = [
+            wrapper for wrapper in wrappers
+            if wrapper is not log_slow_queries]
+
+        def reconnect(**kwargs):
+            # Соединение открывается, когда обёртка метрик уже стоит.
+            template_rendered.disconnect(reconnect)
+            install_wrapper(sender=connection.__class__,
+                            connection=connection)
+
+        template_rendered.connect(reconnect)
+        self.addCleanup(template_rendered.disconnect, reconnect)
+        cache.clear()
+        Client().get(reverse('index'))
+        cache.clear()
+        self.assertTrue(self.entries(reverse('index')))
+        self.assertEqual(connection.execute_wrappers, [log_slow_queries])
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_disabled(self):
+        with self.assertRaises(AssertionError):
+            self.entries(reverse('index'))
+
+
+class SlowQueriesCommandTests(TestCase):
+    def write(self, path, entries):
+        with open(path, 'w', encoding='utf-8') as file:
+            for entry in entries:
+                file.write(json.dumps(entry) + '\n')
+
+    def entry(self, ms, sql, view='index', template=None):
+        return {'ms': ms, 'view': view, 'template': template, 'line': 3,
+                'source': 'posts/views.py:10', 'params': [], 'plan': [
+                    'SCAN posts_post'],
+                'fingerprint': fingerprint_id(fingerprint(sql)),
+                'normalized': fingerprint(sql)}
+
+    def test_worst_offenders_across_rotated_files(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'slow.jsonl')
+        self.write(path, [self.entry(150, 'SELECT a FROM t WHERE id = 1')])
+        self.write(path + '.1', [
+            self.entry(120, 'SELECT a FROM t WHERE id = 2',
+                       template='index.html'),
+            self.entry(400, 'SELECT b FROM u', view='profile'),
+        ])
+        out = StringIO()
+        call_command('slow_queries', log=path, stdout=out)
+        report = out.getvalue()
+        self.assertIn('Медленных запросов: 3, разных: 2', report)
+        self.assertLess(report.index('SELECT b FROM u'),
+                        report.index('SELECT a FROM t WHERE id = ?'))
+        self.assertIn('2 раз, всего 270.0 мс, худший 150.0 мс', report)
+        self.assertIn('index.html:3 (1)', report)
+        self.assertIn('План: SCAN posts_post', report)
@@ -0,0 +1,64 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, override_settings
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    """Новое соединение получает PRAGMA из настроек."""
+
+    def open(self, name):
+        settings_dict = dict(connection.settings_dict, NAME=name)
+        wrapper = DatabaseWrapper(settings_dict, alias='pragmas')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_file_database(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        wrapper = self.open(os.path.join(directory.name, 'db.sqlite3'))
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma(wrapper, 'temp_store'), 2)
+        self.assertEqual(self.pragma(wrapper, 'mmap_size'), 256 * 1024 ** 2)
+
+    def test_wal_not_switched_again(self):
+        """
+        Ожидание включается первым, а уже включённый WAL не переключается:
+        переключение не ждёт чужую запись и падает с «database is locked».
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        name = os.path.join(directory.name, 'db.sqlite3')
+        self.open(name).ensure_connection()
+        statements = []
+        connect = DatabaseWrapper.get_new_connection
+
+        def traced(wrapper, params):
+            db = connect(wrapper, params)
+            db.set_trace_callback(statements.append)
+            return db
+
+        with mock.patch.object(DatabaseWrapper, 'get_new_connection',
+                               traced):
+            self.open(name).ensure_connection()
+        pragmas = [sql for sql in statements if sql.startswith('PRAGMA')]
+        self.assertEqual(pragmas[:2],
+                         ['PRAGMA busy_timeout = 5000', 'PRAGMA journal_mode'])
+        self.assertNotIn('PRAGMA journal_mode = wal', statements)
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 100})
+    def test_settings_respected_in_memory(self):
+        wrapper = self.open(':memory:')
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 100)
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'memory')
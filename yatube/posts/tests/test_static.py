@@ -0,0 +1,96 @@
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import SimpleTestCase, override_settings
+
+from yatube.staticfiles import (IMMUTABLE, REVALIDATE,
+                                PrecompressedStaticHandler)
+
+CSS = b'body { color: black; }\n' * 40
+
+
+class StaticPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.media = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        for directory in (self.source, self.root, self.media):
+            self.addCleanup(shutil.rmtree, directory, True)
+        with open(os.path.join(self.source, 'app.css'), 'wb') as css:
+            css.write(CSS)
+        settings_override = override_settings(
+            STATICFILES_DIRS=[self.source], STATIC_ROOT=self.root,
+            MEDIA_ROOT=self.media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def collect(self):
+        call_command('collectstatic', interactive=False, verbosity=0,
+                     stdout=io.StringIO())
+
+    def request(self, path, **environ):
+        app = mock.Mock(return_value=[b'django'])
+        handler = PrecompressedStaticHandler(app)
+        start_response = mock.Mock()
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, **environ}
+        body = b''.join(handler(environ, start_response))
+        if app.called:
+            return None, body
+        status, headers = start_response.call_args[0]
+        return dict(headers), body
+
+    def test_collectstatic_writes_hashed_and_gzip_files(self):
+        self.collect()
+        url = static('app.css')
+        self.assertRegex(url, r'^/static/app\.[0-9a-f]{12}\.css$')
+        hashed = os.path.join(self.root, os.path.basename(url))
+        with gzip.open(hashed + '.gz') as compressed:
+            self.assertEqual(compressed.read(), CSS)
+
+    def test_missing_manifest_entry_falls_back(self):
+        self.assertEqual(static('missing.css'), '/static/missing.css')
+
+    def test_hashed_file_served_compressed_and_immutable(self):
+        self.collect()
+        headers, body = self.request(static('app.css'),
+                                     HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(headers['Cache-Control'], IMMUTABLE)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Content-Type'], 'text/css')
+        self.assertEqual(gzip.decompress(body), CSS)
+
+        headers, body = self.request(static('app.css'))
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, CSS)
+
+    def test_unhashed_file_revalidated(self):
+        self.collect()
+        headers, _ = self.request('/static/app.css')
+        self.assertEqual(headers['Cache-Control'], REVALIDATE)
+
+    def test_content_addressed_media_immutable(self):
+        name = 'posts/ab/' + 'ab' * 32 + '.gif'
+        os.makedirs(os.path.join(self.media, 'posts/ab'))
+        with open(os.path.join(self.media, name), 'wb') as image:
+            image.write(b'GIF89a')
+        headers, body = self.request('/media/' + name)
+        self.assertEqual(headers['Cache-Control'], IMMUTABLE)
+        self.assertEqual(body, b'GIF89a')
+
+    def test_other_requests_passed_to_django(self):
+        self.collect()
+        for path, method in (('/static/../settings.py', 'GET'),
+                             ('/static/nope.css', 'GET'),
+                             (static('app.css'), 'POST'),
+                             ('/', 'GET')):
+            with self.subTest(path=path, method=method):
+                headers, body = self.request(path, REQUEST_METHOD=method)
+                self.assertIsNone(headers)
+                self.assertEqual(body, b'django')
@@ -0,0 +1,121 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import MediaFile, Post, User
+from ..storage import hashed_name, is_hashed, post_image_storage
+
+TEMP_MEDIA = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x01\x00\x00'
+)
+
+
+def expected_name(content, extension='.gif'):
+    return hashed_name('posts/image' + extension,
+                       hashlib.sha256(content).hexdigest())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(os.path.join(TEMP_MEDIA, 'posts'), ignore_errors=True)
+
+    def create_post(self, name='a.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            text='text', author=self.author,
+            image=SimpleUploadedFile(name, content))
+
+    def test_identical_uploads_share_file(self):
+        first = self.create_post('first.GIF')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, expected_name(SMALL_GIF))
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(MediaFile.objects.get(name=first.image.name).refs, 2)
+        directory = os.path.dirname(post_image_storage.path(
+            first.image.name))
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_file_removed_with_last_reference(self):
+        first = self.create_post()
+        second = self.create_post()
+        name = first.image.name
+        first.delete()
+        MediaFile.delete_unused(name)
+        self.assertTrue(post_image_storage.exists(name))
+        second.delete()
+        MediaFile.delete_unused(name)
+        self.assertFalse(post_image_storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_reupload_restores_file_deleted_concurrently(self):
+        """Файл, удалённый между загрузкой и acquire(), пишется заново."""
+        name = self.create_post().image.name
+        Post.objects.all().delete()
+        save = post_image_storage._save
+
+        def racing_save(name, content):
+            # Хранилище нашло файл и не стало его писать, а потом
+            # delete_unused удалил последнюю ссылку вместе с файлом.
+            saved = save(name, content)
+            MediaFile.delete_unused(name)
+            return saved
+
+        with mock.patch.object(post_image_storage, '_save',
+                               side_effect=racing_save):
+            post = self.create_post('again.gif')
+        self.assertEqual(post.image.name, name)
+        self.assertTrue(post_image_storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 1)
+
+    def test_replaced_image_released(self):
+        post = self.create_post()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('b.gif', SMALL_GIF + b'\x3b')
+        post.save()
+        self.assertEqual(MediaFile.objects.get(name=old_name).refs, 0)
+        self.assertEqual(MediaFile.objects.get(name=post.image.name).refs, 1)
+
+    def test_rehash_moves_legacy_files(self):
+        for legacy in ('posts/one.gif', 'posts/two.gif'):
+            path = post_image_storage.path(legacy)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as legacy_file:
+                legacy_file.write(SMALL_GIF)
+        posts = [Post.objects.create(text='text', author=self.author,
+                                     image=legacy)
+                 for legacy in ('posts/one.gif', 'posts/two.gif')]
+        # Прерванный запуск: новый файл уже есть, старый ещё не удалён.
+        call_command('rehash_media', limit=1, stdout=io.StringIO())
+        call_command('rehash_media', stdout=io.StringIO())
+
+        name = expected_name(SMALL_GIF)
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(post.image.name, name)
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 2)
+        self.assertFalse(post_image_storage.exists('posts/one.gif'))
+        self.assertFalse(post_image_storage.exists('posts/two.gif'))
+        self.assertTrue(is_hashed(name))
+        self.assertTrue(post_image_storage.exists(name))
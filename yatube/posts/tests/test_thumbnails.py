@@ -0,0 +1,131 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail.images import ImageFile
+
+from .. import thumbnails
+from ..models import Post, User
+
+TEMP_MEDIA = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def uploaded_gif(name='small.gif'):
+    return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_original_shown_until_thumbnail_ready(self):
+        """Пока миниатюры нет, страница не рисует её в запросе."""
+        post = Post.objects.create(
+            text='text', author=self.author, image=uploaded_gif())
+        with mock.patch.object(thumbnails.backend, 'get_thumbnail') as draw:
+            response = self.client.get(reverse('index'))
+        draw.assert_not_called()
+        self.assertContains(response, post.image.url)
+
+    def test_ready_thumbnail_used(self):
+        Post.objects.create(
+            text='text', author=self.author, image=uploaded_gif())
+        ready = ImageFile('cache/ready.jpg')
+        ready.set_size((960, 339))
+        with mock.patch.object(thumbnails.backend, 'lookup_many',
+                               return_value=[ready]):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, ready.url)
+
+    def test_page_resolved_with_one_multi_get(self):
+        """Миниатюры страницы ищутся одним обращением к кешу."""
+        for number in range(3):
+            Post.objects.create(text=f'text_{number}', author=self.author,
+                                image=uploaded_gif(f'{number}.gif'))
+        kvstore_cache = thumbnails.default.kvstore.cache
+        with mock.patch.object(kvstore_cache, 'get_many',
+                               wraps=kvstore_cache.get_many) as get_many, \
+                mock.patch.object(thumbnails.backend, 'lookup') as lookup:
+            self.client.get(reverse('index'))
+        get_many.assert_called_once()
+        self.assertEqual(len(get_many.call_args[0][0]), 3)
+        lookup.assert_not_called()
+
+    def test_thumbnail_stored_on_row(self):
+        post = Post.objects.create(
+            text='text', author=self.author, image=uploaded_gif())
+        ready = ImageFile('cache/ready.jpg')
+        ready.set_size((960, 339))
+        thumbnails.store_on_posts(post.image.name, ready)
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail, ready.name)
+        with mock.patch.object(thumbnails.backend, 'lookup_many') as lookup:
+            response = self.client.get(reverse('index'))
+        lookup.assert_not_called()
+        self.assertContains(response, 'width="960" height="339"')
+
+        post.image = uploaded_gif('other.gif')
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail, '')
+        self.assertIsNone(post.thumbnail_width)
+
+    def test_new_post_queued_after_commit(self):
+        with mock.patch('posts.thumbnails.transaction.on_commit') as commit:
+            self.client.post(reverse('new_post'), data={
+                'text': 'text', 'image': uploaded_gif('queued.gif')})
+        post = Post.objects.get(text='text')
+        executor = mock.Mock()
+        with mock.patch.object(thumbnails, '_get_executor',
+                               return_value=executor):
+            commit.call_args[0][0]()
+            commit.call_args[0][0]()
+        executor.submit.assert_called_once_with(
+            thumbnails._render_job, post.image.name)
+        thumbnails._pending.clear()
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_synchronous_executor(self):
+        """Без потоков миниатюры рисуются сразу после фиксации."""
+        with mock.patch('posts.thumbnails.transaction.on_commit') as commit:
+            self.client.post(reverse('new_post'), data={
+                'text': 'text', 'image': uploaded_gif('sync.gif')})
+        post = Post.objects.get(text='text')
+        with mock.patch.object(thumbnails, 'render') as render:
+            commit.call_args[0][0]()
+        render.assert_called_once_with(post.image.name)
+        self.assertNotIn(post.image.name, thumbnails._pending)
+
+    def test_failed_job_does_not_break_worker(self):
+        thumbnails._pending.add('posts/broken.gif')
+        with mock.patch.object(thumbnails, 'render', side_effect=OSError), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails._render_job('posts/broken.gif')
+        self.assertNotIn('posts/broken.gif', thumbnails._pending)
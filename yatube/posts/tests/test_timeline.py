@@ -0,0 +1,98 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry, User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.old_post = Post.objects.create(text='old', author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow(self):
+        self.client.get(reverse('profile_follow', kwargs={
+            'username': self.author.username}))
+
+    def feed(self):
+        response = self.client.get(reverse('follow_index'))
+        return list(response.context['page'].object_list)
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже написанные посты автора."""
+        self.follow()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertEqual(self.feed(), [self.old_post])
+
+    def test_new_post_fans_out(self):
+        """Новый пост раскладывается в ленты подписчиков."""
+        self.follow()
+        author_client = Client()
+        author_client.force_login(self.author)
+        author_client.post(reverse('new_post'), {'text': 'fresh'})
+        new_post = Post.objects.get(text='fresh')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=new_post).exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    def test_unfollow_trims_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        self.follow()
+        self.client.get(reverse('profile_unfollow', kwargs={
+            'username': self.author.username}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_read_on_demand(self):
+        """Посты популярного автора не раскладываются, но видны в ленте."""
+        self.follow()
+        post = Post.objects.create(text='popular', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, COUNT_PAGINATOR=2)
+    def test_streams_merged_across_pages(self):
+        """Лента и посты популярного автора сливаются по страницам."""
+        self.follow()
+        popular = User.objects.create_user(username='Popular')
+        Follow.objects.create(user=self.author, author=popular)
+        self.client.get(reverse('profile_follow', kwargs={
+            'username': popular.username}))
+        posts = [self.old_post]
+        for number in range(4):
+            author = popular if number % 2 else self.author
+            posts.append(Post.objects.create(
+                text=f'post_{number}', author=author))
+        posts.reverse()
+        seen, url = [], reverse('follow_index')
+        while url:
+            page = self.client.get(url).context['page']
+            seen += list(page.object_list)
+            url = (f'{reverse("follow_index")}?after={page.next_cursor}'
+                   if page.next_cursor else None)
+        self.assertEqual(seen, posts)
+        page = self.client.get(
+            f'{reverse("follow_index")}?page=2').context['page']
+        self.assertEqual(list(page.object_list), posts[2:4])
+        before = self.client.get(
+            f'{reverse("follow_index")}?before={page.previous_cursor}')
+        self.assertEqual(list(before.context['page'].object_list),
+                         posts[:2])
+
+    def test_rebuild_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), [self.old_post])
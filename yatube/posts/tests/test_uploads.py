@@ -0,0 +1,138 @@
+import io
+import shutil
+import struct
+import tempfile
+import zlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
+from ..models import Post, User
+
+TEMP_MEDIA = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def png_header(width, height):
+    """PNG с настоящим заголовком огромной картинки и пустыми данными."""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data)))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                         8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b'\x00' * 16))
+            + chunk(b'IEND', b''))
+
+
+def jpeg(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def peak_rss_kb():
+    """Пиковый RSS процесса в килобайтах (Linux) или None."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def reset_peak_rss():
+    # Запись «5» в clear_refs сбрасывает VmHWM до текущего RSS.
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def form(self, content, name='image.png'):
+        return PostForm(data={'text': 'text'}, files={
+            'image': SimpleUploadedFile(name, content)})
+
+    def test_pixel_bomb_rejected_by_header(self):
+        """
+        Картинка 12000×12000 отклоняется без декодирования: пик RSS
+        растёт намного меньше 432 МБ, нужных на её пиксели.
+        """
+        content = png_header(12000, 12000)
+        measured = reset_peak_rss()
+        before = peak_rss_kb()
+        form = self.form(content)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'too_many_pixels')
+        if measured and before is not None:
+            self.assertLess(peak_rss_kb() - before, 50 * 1024)
+
+    def test_pillow_bomb_rejected(self):
+        form = self.form(png_header(100000, 100000))
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(IMAGE_MAX_SIDE=500)
+    def test_oversized_image_downscaled(self):
+        form = self.form(jpeg((2000, 1000)), name='big.jpg')
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (500, 250))
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_small_image_kept(self):
+        form = self.form(jpeg((200, 100)), name='small.jpg')
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (200, 100))
+
+    @override_settings(IMAGE_MAX_SIDE=500)
+    def test_views_store_downscaled_image(self):
+        self.client.post(reverse('new_post'), data={
+            'text': 'new',
+            'image': SimpleUploadedFile('new.jpg', jpeg((1000, 1000)))})
+        post = Post.objects.get(text='new')
+        self.assertEqual((post.image.width, post.image.height), (500, 500))
+
+        self.client.post(
+            reverse('post_edit', args=[self.author.username, post.pk]),
+            data={'text': 'edited', 'image': SimpleUploadedFile(
+                'edited.jpg', jpeg((600, 1200)))})
+        post.refresh_from_db()
+        self.assertEqual((post.image.width, post.image.height), (250, 500))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+    def test_upload_over_byte_limit_rejected(self):
+        response = self.client.post(reverse('new_post'), data={
+            'text': 'huge',
+            'image': SimpleUploadedFile('huge.png', png_header(10, 10)
+                                        + b'\x00' * 4096)})
+        self.assertFalse(Post.objects.filter(text='huge').exists())
+        self.assertEqual(
+            response.context['form'].errors.as_data()['image'][0].code,
+            'file_too_large')
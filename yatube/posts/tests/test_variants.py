@@ -0,0 +1,102 @@
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import variants
+from ..models import ImageVariant, Post, User
+
+TEMP_MEDIA = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def uploaded_jpeg(name='photo.jpg', size=(1200, 600)):
+    buffer = io.BytesIO()
+    Image.linear_gradient('L').resize(size).convert('RGB').save(
+        buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA,
+                   IMAGE_VARIANT_WIDTHS=(320, 640, 960, 1280))
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_variants_rendered_for_each_width_and_format(self):
+        post = Post.objects.create(
+            text='text', author=self.author, image=uploaded_jpeg())
+        variants.render_variants(post.image.name)
+        rendered = ImageVariant.objects.filter(source=post.image.name)
+        # Исходник шириной 1200, поэтому 1280 не рисуется.
+        self.assertEqual(
+            sorted(rendered.values_list('width', 'format')),
+            [(width, image_format)
+             for width in (320, 640, 960)
+             for image_format in ('JPEG', 'WEBP')])
+        for variant in rendered:
+            with self.subTest(variant=variant.file):
+                self.assertTrue(default_storage.exists(variant.file))
+                with default_storage.open(variant.file) as image_file:
+                    image = Image.open(image_file)
+                    self.assertEqual(image.format, variant.format)
+                    self.assertEqual(image.size,
+                                     (variant.width, variant.height))
+        post.refresh_from_db()
+        self.assertIn('320w', post.image_srcset)
+        self.assertIn('.webp 960w', post.image_webp_srcset)
+
+    def test_small_source_not_upscaled(self):
+        post = Post.objects.create(text='text', author=self.author,
+                                   image=uploaded_jpeg(size=(200, 100)))
+        variants.render_variants(post.image.name)
+        self.assertEqual(
+            set(ImageVariant.objects.values_list('width', flat=True)), {200})
+
+    def test_feed_emits_srcset(self):
+        post = Post.objects.create(
+            text='text', author=self.author, image=uploaded_jpeg())
+        variants.render_variants(post.image.name)
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(reverse('index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, 'srcset="/media/variants/')
+        self.assertContains(response, settings.IMAGE_VARIANT_SIZES)
+
+    def test_changed_image_drops_srcset(self):
+        post = Post.objects.create(
+            text='text', author=self.author, image=uploaded_jpeg())
+        variants.render_variants(post.image.name)
+        post.refresh_from_db()
+        post.image = uploaded_jpeg('other.jpg', size=(800, 600))
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_srcset, '')
+
+    def test_report_shows_saved_bytes(self):
+        post = Post.objects.create(
+            text='text', author=self.author, image=uploaded_jpeg())
+        variants.render_variants(post.image.name)
+        out = io.StringIO()
+        call_command('image_variants_report', stdout=out)
+        self.assertIn('Картинок: 1', out.getvalue())
+        self.assertIn('320w WEBP', out.getvalue())
@@ -3,11 +3,16 @@ import time
 from django import forms
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 from http import HTTPStatus
 
-from ..models import Group, Post, Follow
+from ..models import Comment, Group, Post, Follow
+from .utils import on_commit_callbacks
 
 User = get_user_model()
 
@@ -58,6 +63,7 @@ class PostPagesTests(TestCase):
         }
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.author)
@@ -250,11 +256,12 @@ class CacheTests(TestCase):
         self.assertEqual(
             len(response_before.context.get('page').object_list), 1)
 
-        Post.objects.create(
-            text='Text_test_2',
-            author=self.author,
-            group=None
-        )
+        with on_commit_callbacks():
+            Post.objects.create(
+                text='Text_test_2',
+                author=self.author,
+                group=None
+            )
 
         response_after = self.authorized_client.get(reverse('index'))
         self.assertEqual(
@@ -267,6 +274,56 @@ class CacheTests(TestCase):
             len(response_after_20.context.get('page').object_list), 2)
 
 
+class GenerationCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Anonim')
+        cls.group = Group.objects.create(title='Group', slug='group')
+        cls.post = Post.objects.create(
+            text='Text_cached', author=cls.author, group=cls.group)
+        cls.urls = (
+            reverse('index'),
+            reverse('group', kwargs={'slug': cls.group.slug}),
+            reverse('profile', kwargs={'username': cls.author.username}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_new_post_invalidates_fragments(self):
+        """Новый пост сразу виден на страницах с кешем фрагментов."""
+        for url in self.urls:
+            self.guest_client.get(url)
+        with on_commit_callbacks():
+            Post.objects.create(
+                text='Text_fresh', author=self.author, group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Text_fresh')
+
+    def test_edit_invalidates_old_group(self):
+        """Перенос поста в другую группу сбрасывает обе группы."""
+        url = self.urls[1]
+        self.guest_client.get(url)
+        other = Group.objects.create(title='Other', slug='other')
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other
+        with on_commit_callbacks():
+            post.save()
+        self.assertNotContains(self.guest_client.get(url), 'Text_cached')
+
+    def test_comment_invalidates_fragments(self):
+        """Новый комментарий обновляет счётчик в ленте."""
+        self.guest_client.get(self.urls[0])
+        with on_commit_callbacks():
+            Comment.objects.create(
+                post=self.post, author=self.author, text='comment')
+        self.assertContains(
+            self.guest_client.get(self.urls[0]), 'Комментариев: 1')
+
+
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -293,6 +350,9 @@ class PaginatorViewsTest(TestCase):
             ),
         }
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_paginator_ten_records(self):
         for template, reverse_name in self.templates_pages_names.items():
             with self.subTest(reverse_name=reverse_name):
@@ -309,6 +369,61 @@ class PaginatorViewsTest(TestCase):
                     len(response.context.get('page').object_list), 3
                 )
 
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и обратно на первую страницу."""
+        for template, reverse_name in self.templates_pages_names.items():
+            with self.subTest(reverse_name=reverse_name):
+                first = self.autoriz_client.get(reverse_name).context['page']
+                self.assertIsNone(first.previous_cursor)
+                second = self.autoriz_client.get(
+                    reverse_name, {'after': first.next_cursor}
+                ).context['page']
+                self.assertEqual(second.number, 2)
+                self.assertEqual(len(second.object_list), 3)
+                self.assertIsNone(second.next_cursor)
+                back = self.autoriz_client.get(
+                    reverse_name, {'before': second.previous_cursor}
+                ).context['page']
+                self.assertEqual(back.number, 1)
+                self.assertEqual(back.object_list, first.object_list)
+
+    def test_cursor_page_without_count(self):
+        """Страница по курсору не считает всю таблицу."""
+        first = self.autoriz_client.get(reverse('index')).context['page']
+        with CaptureQueriesContext(connection) as queries:
+            self.autoriz_client.get(
+                reverse('index'), {'after': first.next_cursor})
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(*)', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+    def test_bad_page_params_fall_back(self):
+        """Битый курсор и номер страницы вне диапазона дают первую."""
+        for params in ({'after': 'garbage'}, {'page': 'x'}, {'page': 999}):
+            with self.subTest(params=params):
+                response = self.autoriz_client.get(reverse('index'), params)
+                self.assertEqual(response.context['page'].number, 1)
+
+    def test_crafted_cursors_fall_back(self):
+        """Наивное время и pk вне INTEGER не доходят до базы."""
+        cursors = [
+            urlsafe_base64_encode(force_bytes(raw)) for raw in (
+                '2|2020-01-01T00:00:00|1',
+                f'2|2020-01-01T00:00:00+00:00|{2 ** 63}',
+                f'2|2020-01-01T00:00:00+00:00|{-2 ** 63 - 1}',
+            )]
+        urls = (reverse('index'),
+                reverse('profile', args=[self.author.username]))
+        for url in urls:
+            for cursor in cursors:
+                for direction in ('after', 'before'):
+                    with self.subTest(url=url, cursor=cursor,
+                                      direction=direction):
+                        response = self.autoriz_client.get(
+                            url, {direction: cursor})
+                        self.assertEqual(
+                            response.context['page'].number, 1)
+
 
 class AboutPagesTests(TestCase):
     @classmethod
@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def on_commit_callbacks(using=DEFAULT_DB_ALIAS):
+    """
+    Выполняет колбэки transaction.on_commit(), отложенные внутри блока.
+    TestCase не коммитит транзакцию, и сами они не запускаются; в Django
+    3.2 то же делает TestCase.captureOnCommitCallbacks(execute=True).
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    try:
+        yield
+    finally:
+        for _, callback in connection.run_on_commit[start:]:
+            callback()
@@ -0,0 +1,233 @@
+"""
+Миниатюры картинок постов.
+
+Миниатюры рисуются не в запросе, а в пуле потоков после фиксации
+транзакции; с THUMBNAIL_WORKERS = 0 - сразу, в том же потоке. Пока
+миниатюры нет, шаблон показывает исходную картинку.
+Геометрии, которые используют шаблоны, перечислены в
+settings.THUMBNAIL_GEOMETRIES.
+
+Миниатюра ленты (ROW_GEOMETRY) после отрисовки записывается в строку
+поста, остальные ищутся в хранилище ключей sorl сразу для всей
+страницы через prefetch().
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import variants
+from .models import Post
+from .storage import post_image_storage
+
+logger = logging.getLogger(__name__)
+
+# Миниатюра, которая хранится в строке поста.
+ROW_GEOMETRY = 'post'
+
+_executor = None
+_executor_lock = threading.Lock()
+# Картинки, которые уже стоят в очереди пула.
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+class LookupBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет найти готовую миниатюру, не рисуя её."""
+
+    def thumbnail_options(self, source, options):
+        # Те же значения по умолчанию, что подставляет get_thumbnail(),
+        # иначе имя миниатюры не совпадёт.
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры без обращения к хранилищу."""
+        source = ImageFile(file_)
+        options = self.thumbnail_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string, **options):
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+    def lookup_many(self, files, geometry_string, **options):
+        """
+        Готовые миниатюры для списка картинок: одно чтение из кеша и
+        один запрос к таблице sorl для промахов.
+        """
+        thumbnails = [self.thumbnail_file(file_, geometry_string, **options)
+                      for file_ in files]
+        kvstore = default.kvstore
+        if not isinstance(kvstore, CachedDBStore):
+            return [kvstore.get(thumbnail) for thumbnail in thumbnails]
+        keys = [add_prefix(thumbnail.key) for thumbnail in thumbnails]
+        values = kvstore.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            kvstore.cache.set_many(
+                found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        return [
+            deserialize_image_file(values[key])
+            if isinstance(values.get(key), str) else None
+            for key in keys
+        ]
+
+
+backend = LookupBackend()
+
+
+def geometry(name):
+    geometry_string, options = settings.THUMBNAIL_GEOMETRIES[name]
+    return geometry_string, dict(options)
+
+
+def source_file(image_name):
+    """
+    Картинка поста для sorl. Имя миниатюры зависит и от хранилища
+    исходника, поэтому оно должно совпадать с хранилищем Post.image.
+    """
+    return ImageFile(image_name, post_image_storage)
+
+
+def render(image_name):
+    """
+    Рисует все варианты и миниатюры картинки и записывает миниатюру
+    ленты в пост.
+    """
+    variants.render_variants(image_name)
+    for name, (geometry_string, options) in (
+            settings.THUMBNAIL_GEOMETRIES.items()):
+        thumbnail = backend.get_thumbnail(
+            source_file(image_name), geometry_string, **options)
+        if name == ROW_GEOMETRY:
+            store_on_posts(image_name, thumbnail)
+
+
+def store_on_posts(image_name, thumbnail):
+    width, height = thumbnail.size
+    posts = Post.objects.filter(image=image_name).exclude(
+        thumbnail=thumbnail.name)
+    for post in posts:
+        post.thumbnail = thumbnail.name
+        post.thumbnail_width, post.thumbnail_height = width, height
+        # Сохранение через save(), чтобы сигналы сбросили кеши лент.
+        post.save(update_fields=[
+            'thumbnail', 'thumbnail_width', 'thumbnail_height'])
+
+
+def _from_row(post):
+    thumbnail = ImageFile(post.thumbnail, default.storage)
+    thumbnail.set_size((post.thumbnail_width, post.thumbnail_height))
+    return thumbnail
+
+
+def _render_job(image_name):
+    try:
+        render(image_name)
+    except Exception:
+        logger.exception('Не удалось нарисовать миниатюры %s', image_name)
+    finally:
+        with _pending_lock:
+            _pending.discard(image_name)
+        close_old_connections()
+
+
+class SynchronousExecutor:
+    """Исполнитель без потоков: задача выполняется прямо в submit()."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+def _get_executor():
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        return SynchronousExecutor()
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def schedule(image):
+    """Ставит картинку в очередь пула после фиксации транзакции."""
+    if not image:
+        return
+    image_name = image.name
+
+    def submit():
+        with _pending_lock:
+            if image_name in _pending:
+                return
+            _pending.add(image_name)
+        _get_executor().submit(_render_job, image_name)
+
+    transaction.on_commit(submit)
+
+
+def prefetch(posts, name=ROW_GEOMETRY):
+    """
+    Находит миниатюры для страницы постов разом и прикрепляет их к
+    постам; шаблон потом берёт их без запросов.
+    """
+    posts = [post for post in posts if post.image and not (
+        name == ROW_GEOMETRY and post.thumbnail)]
+    if not posts:
+        return
+    geometry_string, options = geometry(name)
+    found = backend.lookup_many(
+        [post.image for post in posts], geometry_string, **options)
+    for post, thumbnail in zip(posts, found):
+        post._thumbnails = {**getattr(post, '_thumbnails', {}),
+                            name: thumbnail}
+
+
+def thumbnail_for(post, name=ROW_GEOMETRY):
+    """
+    Готовая миниатюра поста или исходная картинка, если миниатюры ещё
+    нет. Миниатюры старых постов рисует команда render_thumbnails.
+    """
+    if not post.image:
+        return None
+    if name == ROW_GEOMETRY and post.thumbnail:
+        return _from_row(post)
+    prefetched = getattr(post, '_thumbnails', {})
+    if name in prefetched:
+        thumbnail = prefetched[name]
+    else:
+        geometry_string, options = geometry(name)
+        thumbnail = backend.lookup(post.image, geometry_string, **options)
+    if thumbnail is not None:
+        return thumbnail
+    return post.image
@@ -0,0 +1,158 @@
+"""
+Материализованная лента подписок (fan-out on write).
+
+Новый пост раскладывается в TimelineEntry всех подписчиков автора.
+Авторы, у которых подписчиков больше settings.TIMELINE_FANOUT_LIMIT,
+не раскладываются: их посты подмешиваются в ленту при чтении.
+
+Страница ленты читается по индексу TimelineEntry (user, pub_date, post)
+отдельно от постов популярных авторов, оба потока ограничены размером
+страницы и сливаются в памяти; посты страницы достаются по id.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginator import CursorPaginator
+
+CHUNK_SIZE = 1000
+
+
+def popular_authors(user):
+    """id авторов из подписок user, чьи посты читаются напрямую."""
+    return AuthorStats.objects.filter(
+        author__in=Follow.objects.filter(user=user).values('author'),
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values('author')
+
+
+def is_popular(author):
+    return AuthorStats.objects.filter(
+        author=author,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=CHUNK_SIZE, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает пост в ленты подписчиков автора."""
+    if is_popular(post.author_id):
+        return
+    followers = (Follow.objects.filter(author=post.author_id)
+                 .values_list('user', flat=True).iterator())
+    chunk = []
+    for user_id in followers:
+        chunk.append(TimelineEntry(
+            user_id=user_id, post=post, pub_date=post.pub_date))
+        if len(chunk) >= CHUNK_SIZE:
+            _bulk_insert(chunk)
+            chunk = []
+    if chunk:
+        _bulk_insert(chunk)
+
+
+def backfill(user, author):
+    """Добавляет в ленту user последние посты нового автора."""
+    if is_popular(author):
+        return
+    posts = (Post.objects.filter(author=author)
+             .values_list('pk', 'pub_date')
+             [:settings.TIMELINE_BACKFILL_LIMIT])
+    _bulk_insert([
+        TimelineEntry(user_id=getattr(user, 'pk', user), post_id=pk,
+                      pub_date=pub_date)
+        for pk, pub_date in posts
+    ])
+
+
+def trim(user, author):
+    """Убирает из ленты user посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def rebuild(user):
+    """Пересобирает ленту user с нуля по текущим подпискам."""
+    TimelineEntry.objects.filter(user=user).delete()
+    authors = Follow.objects.filter(user=user).values_list(
+        'author', flat=True)
+    for author in authors:
+        backfill(user, author)
+
+
+def follow_feed(user):
+    """Посты ленты подписок: материализованные плюс популярных авторов."""
+    return Post.objects.feed().filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=popular_authors(user))
+    )
+
+
+def _merge(streams, limit, reverse=True):
+    """Сливает отсортированные потоки (pub_date, id) без повторов."""
+    keys, seen = [], set()
+    for key in heapq.merge(*streams, reverse=reverse):
+        if key[1] not in seen:
+            seen.add(key[1])
+            keys.append(key)
+    return keys[:limit]
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Курсорная навигация по ленте подписок user.
+
+    object_list (follow_feed) нужен только для count; строки страницы
+    берутся из TimelineEntry и постов популярных авторов.
+    """
+
+    def __init__(self, user, per_page, max_offset_page=None):
+        super().__init__(follow_feed(user), per_page, max_offset_page)
+        self.user = user
+        self.popular = list(popular_authors(user).values_list(
+            'author', flat=True))
+
+    def _streams(self, condition, descending=True):
+        """Ключи ленты и популярных авторов по условию на (pub_date, id)."""
+        sign = '-' if descending else ''
+        streams = [TimelineEntry.objects.filter(
+            condition('post_id'), user=self.user,
+        ).order_by(f'{sign}pub_date', f'{sign}post_id').values_list(
+            'pub_date', 'post_id')]
+        if self.popular:
+            streams.append(Post.objects.filter(
+                condition('pk'), author__in=self.popular,
+            ).order_by(f'{sign}pub_date', f'{sign}pk').values_list(
+                'pub_date', 'pk'))
+        return streams
+
+    def _posts(self, keys):
+        posts = Post.objects.feed().in_bulk([pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
+
+    def _newest(self, offset, limit):
+        streams = self._streams(lambda field: Q())
+        keys = _merge([stream[:offset + limit] for stream in streams],
+                      offset + limit)
+        return self._posts(keys[offset:])
+
+    def _older(self, pub_date, pk, limit):
+        def condition(field):
+            return Q(pub_date__lt=pub_date) | Q(
+                pub_date=pub_date, **{f'{field}__lt': pk})
+        streams = self._streams(condition)
+        return self._posts(_merge(
+            [stream[:limit] for stream in streams], limit))
+
+    def _newer(self, pub_date, pk, limit):
+        def condition(field):
+            return Q(pub_date__gt=pub_date) | Q(
+                pub_date=pub_date, **{f'{field}__gt': pk})
+        streams = self._streams(condition, descending=False)
+        return self._posts(_merge(
+            [stream[:limit] for stream in streams], limit, reverse=False))
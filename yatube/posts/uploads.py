@@ -0,0 +1,69 @@
+"""
+Приём картинок постов с ограниченным расходом памяти.
+
+Загрузка пишется на диск кусками (settings.FILE_UPLOAD_HANDLERS), размеры
+картинки проверяются по заголовку до полного декодирования, а слишком
+большие исходники уменьшаются до settings.IMAGE_MAX_SIDE.
+"""
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загрузку во временный файл и перестаёт писать, когда она
+    превышает settings.IMAGE_UPLOAD_MAX_BYTES. Такой файл помечается
+    атрибутом too_large, форма его отклоняет.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.too_large = True
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.too_large = self.too_large
+        return upload
+
+
+def too_many_pixels(width, height):
+    return width * height > settings.IMAGE_MAX_PIXELS
+
+
+def needs_downscale(width, height):
+    return max(width, height) > settings.IMAGE_MAX_SIDE
+
+
+def downscale(upload):
+    """
+    Уменьшает картинку до settings.IMAGE_MAX_SIDE по большей стороне.
+    JPEG декодируется сразу в уменьшенном масштабе (draft), большой
+    результат уходит во временный файл, а не остаётся в памяти.
+    """
+    max_side = settings.IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image_format = image.format
+        image.draft(image.mode, (max_side, max_side))
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        image.save(output, image_format)
+    size = output.tell()
+    output.seek(0)
+    return UploadedFile(output, upload.name, upload.content_type, size,
+                        upload.charset)
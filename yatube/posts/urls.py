@@ -6,6 +6,7 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("new/", views.new_post, name="new_post"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.search, name="search"),
     path("<str:username>/<int:post_id>/edit/",
          views.post_edit, name="post_edit"),
     path("group/<slug:slug>/", views.group_posts, name="group"),
@@ -0,0 +1,111 @@
+"""
+Варианты картинки поста разной ширины для srcset.
+
+Каждая ширина из settings.IMAGE_VARIANT_WIDTHS кодируется в форматах
+settings.IMAGE_VARIANT_FORMATS один раз, в фоновом пуле миниатюр.
+Варианты обрезаются до пропорций миниатюры ленты, поэтому браузер
+может взять любой из них. Готовые srcset записываются в строку поста.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import ImageVariant, Post
+from .storage import post_image_storage
+
+EXTENSIONS = {ImageVariant.JPEG: 'jpg', ImageVariant.WEBP: 'webp'}
+SAVE_OPTIONS = {
+    ImageVariant.JPEG: {'optimize': True, 'progressive': True},
+    ImageVariant.WEBP: {'method': 4},
+}
+
+
+def aspect_ratio():
+    """Пропорции миниатюры ленты, например 960x339."""
+    geometry_string, _ = settings.THUMBNAIL_GEOMETRIES['post']
+    width, height = geometry_string.split('x')
+    return int(width) / int(height)
+
+
+def widths_for(source_width):
+    """Ширины вариантов без увеличения исходника."""
+    widths = sorted(width for width in settings.IMAGE_VARIANT_WIDTHS
+                    if width <= source_width)
+    return widths or [source_width]
+
+
+def _open(image_name, max_width):
+    with post_image_storage.open(image_name) as source:
+        image = Image.open(source)
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', (max_width, max_width))
+        image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=settings.IMAGE_VARIANT_QUALITY,
+               **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+def _save(name, content):
+    # Имя варианта постоянное: повторная отрисовка заменяет файл.
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content))
+
+
+def render_variants(image_name):
+    """Рисует варианты картинки и записывает srcset в посты с ней."""
+    image = _open(image_name, max(settings.IMAGE_VARIANT_WIDTHS))
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    ratio = aspect_ratio()
+    kept = []
+    for width in widths_for(image.width):
+        height = max(1, round(width / ratio))
+        resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        for image_format in settings.IMAGE_VARIANT_FORMATS:
+            content = _encode(resized, image_format)
+            name = _save('variants/{}-{}w.{}'.format(
+                stem, width, EXTENSIONS[image_format]), content)
+            variant, _ = ImageVariant.objects.update_or_create(
+                source=image_name, width=width, format=image_format,
+                defaults={'height': height, 'file': name,
+                          'size': len(content)},
+            )
+            kept.append(variant.pk)
+    ImageVariant.objects.filter(source=image_name).exclude(
+        pk__in=kept).delete()
+    store_on_posts(image_name)
+
+
+def srcset(variants, image_format):
+    return ', '.join(
+        '{} {}w'.format(default_storage.url(variant.file), variant.width)
+        for variant in sorted(variants, key=lambda variant: variant.width)
+        if variant.format == image_format
+    )
+
+
+def store_on_posts(image_name):
+    variants = list(ImageVariant.objects.filter(source=image_name))
+    values = {
+        'image_srcset': srcset(variants, ImageVariant.JPEG),
+        'image_webp_srcset': srcset(variants, ImageVariant.WEBP),
+    }
+    for post in Post.objects.filter(image=image_name):
+        if all(getattr(post, field) == value
+               for field, value in values.items()):
+            continue
+        for field, value in values.items():
+            setattr(post, field, value)
+        # Сохранение через save(), чтобы сигналы сбросили кеши лент.
+        post.save(update_fields=list(values))
@@ -1,54 +1,84 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.conf import settings
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
+
+from yatube.replica import mark_written, sticks_to_primary
 
+from . import etags, hot_feed, thumbnails, timeline
+from .caching import author_scope, get_generation, group_scope, index_scope
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Follow
+from .models import AuthorStats, Post, Group, User, Follow
+from .paginator import paginate
+from .search import posts_by_ids, ranked_ids
 
 
+@condition(etag_func=etags.index_etag)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.COUNT_PAGINATOR)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.feed()
+    scope = index_scope()
+    generation = get_generation(scope)
+    page = paginate(
+        request, post_list, cache_key=f'{scope}:{generation}',
+        hot_window=lambda params, per_page: hot_feed.feed.get_window(
+            params, per_page, generation),
+    )
     return render(
         request,
         'index.html',
-        {'page': page, 'paginator': paginator}
+        {
+            'page': page,
+            'paginator': page.paginator,
+            'generation': generation,
+            'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        }
     )
 
 
+@condition(etag_func=etags.group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group)
-    paginator = Paginator(posts, settings.COUNT_PAGINATOR)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, "posts/group.html", {'page': page,
-                  'group': group, 'posts': posts, 'paginator': paginator})
-
-
+    posts = Post.objects.feed().filter(group=group)
+    scope = group_scope(group.pk)
+    generation = get_generation(scope)
+    page = paginate(request, posts, cache_key=f'{scope}:{generation}')
+    return render(request, "posts/group.html", {
+        'page': page,
+        'group': group,
+        'posts': posts,
+        'paginator': page.paginator,
+        'generation': generation,
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    })
+
+
+@condition(etag_func=etags.profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
     user = request.user
-    posts = Post.objects.filter(author=author)
-    count_posts = posts.count()
-    paginator = Paginator(posts, settings.COUNT_PAGINATOR)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    stats = AuthorStats.for_author(author)
+    posts = Post.objects.feed().filter(author=author)
+    scope = author_scope(author.pk)
+    generation = get_generation(scope)
+    page = paginate(request, posts, cache_key=f'{scope}:{generation}')
     following = user.is_authenticated and (
         Follow.objects.filter(user=user, author=author).exists())
     return render(request, "posts/profile.html", {
         "author": author,
+        "stats": stats,
         "page": page,
-        "count_posts": count_posts,
-        "following": following
+        "count_posts": stats.posts_count,
+        "following": following,
+        "generation": generation,
+        "cache_timeout": settings.FRAGMENT_CACHE_TIMEOUT,
     }
     )
 
 
 @login_required
+@sticks_to_primary
 def new_post(request):
     if request.method == 'POST':
         form = PostForm(request.POST, files=request.FILES or None)
@@ -57,6 +87,8 @@ def new_post(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            mark_written(request)
+            thumbnails.schedule(post.image)
 
             return redirect('index')
         return render(request, 'posts/new.html', {'form': form})
@@ -64,15 +96,34 @@ def new_post(request):
     return render(request, 'posts/new.html', {'form': form})
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    # Результаты идут по релевантности, поэтому страницы нумеруются;
+    # их число ограничено, как у старых ссылок ?page=N в лентах.
+    limit = settings.COUNT_PAGINATOR * settings.PAGINATOR_MAX_OFFSET_PAGE
+    paginator = Paginator(ranked_ids(query, limit), settings.COUNT_PAGINATOR)
+    page = paginator.get_page(request.GET.get('page'))
+    page.object_list = posts_by_ids(page.object_list)
+    return render(
+        request,
+        "posts/search.html",
+        {'query': query, 'page': page, 'paginator': paginator}
+    )
+
+
+@condition(etag_func=etags.post_etag)
 def post_view(request, username, post_id):
-    post_object = get_object_or_404(Post.objects.select_related('author'),
-                                    id=post_id, author__username=username)
-    post_count = Post.objects.filter(author=post_object.author).count()
-    comments = post_object.comments.all()
+    post_object = get_object_or_404(
+        Post.objects.feed().select_related('author__stats'),
+        id=post_id, author__username=username)
+    stats = AuthorStats.for_author(post_object.author)
+    comments = post_object.comments.select_related('author').order_by(
+        'created')
     form = CommentForm()
     context_dict = {
         'author': post_object.author,
-        'post_count': post_count,
+        'stats': stats,
+        'post_count': stats.posts_count,
         'post': post_object,
         'comments': comments,
         'form': form,
@@ -81,6 +132,7 @@ def post_view(request, username, post_id):
 
 
 @login_required
+@sticks_to_primary
 def post_edit(request, username, post_id):
     if request.user.username != username:
         return redirect('index')
@@ -94,6 +146,9 @@ def post_edit(request, username, post_id):
     )
     if form.is_valid():
         form.save()
+        mark_written(request)
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image)
         return redirect('post', username=username, post_id=post_id)
     return render(request, 'posts/new.html', {'form': form, 'post': post})
 
@@ -112,6 +167,7 @@ def server_error(request):
 
 
 @login_required
+@sticks_to_primary
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post,
                              author__username=username,
@@ -122,33 +178,41 @@ def add_comment(request, username, post_id):
         new_comment.author = request.user
         new_comment.post = post
         new_comment.save()
+        mark_written(request)
         return redirect('post', username, post_id)
     return render(request, "post.html", context={"form": form})
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, settings.COUNT_PAGINATOR)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = timeline.TimelinePaginator(
+        request.user, settings.COUNT_PAGINATOR)
+    page = paginate(request, paginator.object_list, paginator=paginator)
     return render(
         request,
         "includes/follow.html",
-        {'page': page, 'paginator': paginator}
+        {'page': page, 'paginator': page.paginator}
     )
 
 
 @login_required
+@sticks_to_primary
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        _, created = Follow.objects.get_or_create(
+            user=request.user, author=author)
+        if created:
+            mark_written(request)
     return redirect('profile', username=username)
 
 
 @login_required
+@sticks_to_primary
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    deleted, _ = Follow.objects.filter(
+        user=request.user, author=author).delete()
+    if deleted:
+        mark_written(request)
     return redirect('profile', username=username)
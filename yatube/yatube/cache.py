@@ -0,0 +1,375 @@
+"""
+Кеш для нескольких процессов gunicorn на одной машине.
+
+SQLiteCache хранит значения в общем файле SQLite. TwoTierCache держит
+перед ним небольшой LRU в памяти процесса (L1) и узнаёт об изменениях
+в других процессах через канал версий: ключи разбиты на корзины, и
+каждая запись увеличивает счётчик своей корзины в L2. Не чаще раза в
+CHECK_INTERVAL секунд процесс сверяет счётчики и выбрасывает из L1
+корзины, которые изменились.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache.TwoTierCache',
+            'LOCATION': '/var/cache/yatube/cache.sqlite3',
+            'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'CHECK_INTERVAL': 1},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+from yatube import metrics
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite; incr и add атомарны между процессами."""
+
+    cull_every = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # После fork соединение родителя использовать нельзя.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    @staticmethod
+    def _encode(value):
+        # Целые числа хранятся как есть, чтобы incr работал в SQL.
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())).fetchone()
+        return default if row is None else self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        return {key: value for key, (value, _) in
+                self.get_many_expiring(keys, version=version).items()}
+
+    def get_many_expiring(self, keys, version=None):
+        """{key: (value, expires)}, expires - время time() или None."""
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        if not made:
+            return {}
+        placeholders = ', '.join('?' * len(made))
+        rows = self._connection().execute(
+            f'SELECT key, value, expires FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*made, time.time()))
+        return {made[key]: (self._decode(value), expires)
+                for key, value, expires in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, self._encode(value), self.get_backend_timeout(timeout)))
+        self._maybe_cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self._connection().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, self._encode(value), self.get_backend_timeout(timeout),
+             time.time()))
+        self._maybe_cull()
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()))
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._decode(row[0]) + delta
+            connection.execute('UPDATE cache SET value = ? WHERE key = ?',
+                               (self._encode(value), key))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _maybe_cull(self):
+        self._writes += 1
+        if self._writes % self.cull_every:
+            return
+        connection = self._connection()
+        connection.execute('DELETE FROM cache WHERE expires <= ?',
+                           (time.time(),))
+        count, = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,))
+
+
+def _count(name, hits, misses):
+    if hits:
+        metrics.inc(name, hits, result='hit')
+    if misses:
+        metrics.inc(name, misses, result='miss')
+
+
+class TwoTierCache(BaseCache):
+    """
+    LRU в памяти процесса (L1) поверх общего кеша (L2).
+
+    Запись идёт в L2 и увеличивает версию корзины ключа; другие
+    процессы сбрасывают у себя эту корзину при следующей сверке.
+    Значение в L1 живёт не дольше L1_TIMEOUT секунд и не дольше, чем
+    в L2 (если L2 умеет get_many_expiring, как SQLiteCache).
+    """
+
+    channel_key = '__two_tier__:bucket:{}'
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        l2_params = {
+            name: params[name]
+            for name in ('TIMEOUT', 'KEY_PREFIX', 'VERSION', 'KEY_FUNCTION')
+            if name in params
+        }
+        l2_params['OPTIONS'] = options.get('L2_OPTIONS', {})
+        self._l2 = import_string(options.get(
+            'L2_BACKEND', 'yatube.cache.SQLiteCache'))(location, l2_params)
+        self._l1 = OrderedDict()
+        self._l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._l1_timeout = options.get('L1_TIMEOUT', 60)
+        self._buckets = options.get('CHANNEL_BUCKETS', 64)
+        self._check_interval = options.get('CHECK_INTERVAL', 1)
+        self._checked_at = 0
+        self._seen = {}
+        self._lock = threading.RLock()
+
+    def _bucket(self, key, version):
+        made = self._l2.make_key(key, version=version)
+        return made, zlib.crc32(made.encode()) % self._buckets
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._checked_at < self._check_interval:
+            return
+        self._checked_at = now
+        keys = [self.channel_key.format(b) for b in range(self._buckets)]
+        versions = self._l2.get_many(keys)
+        changed = set()
+        for bucket, key in enumerate(keys):
+            version = versions.get(key)
+            if self._seen.get(bucket) != version:
+                changed.add(bucket)
+                self._seen[bucket] = version
+        if changed:
+            self._drop_buckets(changed)
+
+    def _drop_buckets(self, buckets):
+        for key in [key for key, (_, bucket, _) in self._l1.items()
+                    if bucket in buckets]:
+            del self._l1[key]
+
+    def _publish(self, bucket):
+        """Сообщает другим процессам, что корзина изменилась."""
+        key = self.channel_key.format(bucket)
+        try:
+            version = self._l2.incr(key)
+        except ValueError:
+            if self._l2.add(key, 1, timeout=None):
+                version = 1
+            else:
+                version = self._l2.incr(key)
+        with self._lock:
+            seen = self._seen.get(bucket)
+            if seen is None or version != seen + 1:
+                # Корзину меняли и другие процессы.
+                self._drop_buckets({bucket})
+            self._seen[bucket] = version
+
+    def _l2_get_many(self, keys, version):
+        """{key: (value, expires)} из L2; без срока - только L1_TIMEOUT."""
+        get_many = getattr(self._l2, 'get_many_expiring', None)
+        if get_many is not None:
+            return get_many(keys, version=version)
+        return {key: (value, None) for key, value in
+                self._l2.get_many(keys, version=version).items()}
+
+    def _remember(self, made, bucket, value, expires):
+        """Кладёт значение в L1; expires - срок в L2 по time() или None."""
+        l1_timeout = self._l1_timeout
+        if expires is not None:
+            l1_timeout = min(l1_timeout, expires - time.time())
+        if l1_timeout <= 0:
+            self._l1.pop(made, None)
+            return
+        self._l1[made] = (
+            time.monotonic() + l1_timeout, bucket,
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        self._l1.move_to_end(made)
+        while len(self._l1) > self._l1_max_entries:
+            self._l1.popitem(last=False)
+
+    def _l1_get(self, made):
+        entry = self._l1.get(made)
+        if entry is None:
+            return None
+        expires, _, payload = entry
+        if expires <= time.monotonic():
+            del self._l1[made]
+            return None
+        self._l1.move_to_end(made)
+        return entry
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = self.get_many([key], version=version).get(key, sentinel)
+        return default if value is sentinel else value
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, {}
+        with self._lock:
+            self._sync()
+            for key in keys:
+                made, bucket = self._bucket(key, version)
+                entry = self._l1_get(made)
+                if entry is None:
+                    # L2 читается без блокировки: запоминаем версию
+                    # корзины, чтобы не положить в L1 значение, которое
+                    # успели сбросить, пока мы его читали.
+                    missing[key] = (made, bucket, self._seen.get(bucket))
+                else:
+                    found[key] = pickle.loads(entry[2])
+        _count('yatube_cache_l1_total', len(found), len(missing))
+        if not missing:
+            return found
+        fetched = self._l2_get_many(list(missing), version)
+        _count('yatube_cache_l2_total', len(fetched),
+               len(missing) - len(fetched))
+        with self._lock:
+            for key, (made, bucket, seen) in missing.items():
+                if key not in fetched:
+                    continue
+                value, expires = fetched[key]
+                found[key] = value
+                if self._seen.get(bucket) == seen:
+                    self._remember(made, bucket, value, expires)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made, bucket = self._bucket(key, version)
+        self._l2.set(key, value, timeout, version=version)
+        self._publish(bucket)
+        with self._lock:
+            self._remember(made, bucket, value,
+                           self.get_backend_timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made, bucket = self._bucket(key, version)
+        if not self._l2.add(key, value, timeout, version=version):
+            return False
+        self._publish(bucket)
+        with self._lock:
+            self._remember(made, bucket, value,
+                           self.get_backend_timeout(timeout))
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        made, bucket = self._bucket(key, version)
+        value = self._l2.incr(key, delta, version=version)
+        self._publish(bucket)
+        with self._lock:
+            self._remember(made, bucket, value, None)
+        return value
+
+    def delete(self, key, version=None):
+        made, bucket = self._bucket(key, version)
+        self._l2.delete(key, version=version)
+        self._publish(bucket)
+        with self._lock:
+            self._l1.pop(made, None)
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def clear(self):
+        self._l2.clear()
+        with self._lock:
+            self._l1.clear()
+            self._seen.clear()
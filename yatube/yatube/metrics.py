@@ -0,0 +1,286 @@
+"""
+Метрики запросов в формате Prometheus на /metrics.
+
+MetricsMiddleware пишет для каждого представления число запросов и
+гистограммы задержки, числа SQL-запросов и времени SQL. Шаблоны через
+TimedDjangoTemplates добавляют время отрисовки, {% swrcache %} - попадания
+и промахи кеша фрагментов, TwoTierCache - попадания в L1 и L2.
+
+Процесс копит приращения в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в общий файл SQLite
+(settings.METRICS_PATH), так что /metrics любого процесса gunicorn
+показывает сумму по всем. Без METRICS_PATH счётчики живут в памяти
+процесса.
+
+Доступ к /metrics - по токену METRICS_TOKEN или адресам
+METRICS_ALLOWED_IPS (см. settings); по умолчанию закрыт.
+"""
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Имя -> (тип, описание, границы корзин гистограммы).
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Запросы по представлению, методу и статусу.', None),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа представления.', LATENCY_BUCKETS),
+    'yatube_request_queries': (
+        'histogram', 'SQL-запросов на один запрос.', QUERY_BUCKETS),
+    'yatube_request_sql_seconds': (
+        'histogram', 'Время SQL на один запрос.', LATENCY_BUCKETS),
+    'yatube_template_render_seconds': (
+        'histogram', 'Время отрисовки шаблона.', LATENCY_BUCKETS),
+    'yatube_fragment_cache_total': (
+        'counter', 'Попадания и промахи {% swrcache %}.', None),
+    'yatube_page_cache_total': (
+        'counter', 'Попадания и промахи кеша страниц.', None),
+    'yatube_cache_l1_total': (
+        'counter', 'Чтения TwoTierCache из памяти процесса.', None),
+    'yatube_cache_l2_total': (
+        'counter', 'Чтения TwoTierCache из общего кеша после промаха L1.',
+        None),
+}
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _labels(labels):
+    return ','.join(f'{name}="{_escape(value)}"'
+                    for name, value in sorted(labels.items()))
+
+
+class QueryStats:
+    """Число и суммарное время SQL-запросов через execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class Registry:
+    """
+    Значения хранятся по ключу (метрика, метки, le). У счётчика le
+    пустое; у гистограммы это граница корзины (накопительно, как в
+    Prometheus) или 'sum'.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending = defaultdict(float)
+        self._totals = defaultdict(float)
+        self._flushed_at = time.monotonic()
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._pending[name, _labels(labels), ''] += value
+
+    def observe(self, name, value, **labels):
+        key = _labels(labels)
+        with self._lock:
+            for bound in METRICS[name][2]:
+                if value <= bound:
+                    self._pending[name, key, f'{bound:g}'] += 1
+            self._pending[name, key, '+Inf'] += 1
+            self._pending[name, key, 'sum'] += value
+
+    def _connection(self, path):
+        # После fork соединение родителя использовать нельзя.
+        pid = os.getpid()
+        if getattr(self._local, 'key', None) != (pid, path):
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS samples (name TEXT, '
+                'labels TEXT, le TEXT, value REAL, '
+                'PRIMARY KEY (name, labels, le))')
+            self._local.connection = connection
+            self._local.key = (pid, path)
+        return self._local.connection
+
+    def flush(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and (now - self._flushed_at
+                              < settings.METRICS_FLUSH_INTERVAL):
+                return
+            pending, self._pending = self._pending, defaultdict(float)
+            self._flushed_at = now
+        if not pending:
+            return
+        path = settings.METRICS_PATH
+        if path is None:
+            with self._lock:
+                for key, value in pending.items():
+                    self._totals[key] += value
+            return
+        try:
+            with self._connection(path) as connection:
+                connection.executemany(
+                    'INSERT INTO samples VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (name, labels, le) '
+                    'DO UPDATE SET value = value + excluded.value',
+                    [(*key, value) for key, value in pending.items()])
+        except sqlite3.Error:
+            # Файл занят: попробуем со следующим запросом.
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] += value
+
+    def collect(self):
+        """Все значения {(метрика, метки, le): число} с учётом чужих."""
+        self.flush(force=True)
+        path = settings.METRICS_PATH
+        if path is None:
+            with self._lock:
+                return dict(self._totals)
+        rows = self._connection(path).execute(
+            'SELECT name, labels, le, value FROM samples')
+        return {(name, labels, le): value
+                for name, labels, le, value in rows}
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._totals.clear()
+        path = settings.METRICS_PATH
+        if path is not None:
+            with self._connection(path) as connection:
+                connection.execute('DELETE FROM samples')
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+
+def _sample(name, labels, value, le=None):
+    if le is not None:
+        labels = ','.join(filter(None, (labels, f'le="{le}"')))
+    if labels:
+        name = f'{name}{{{labels}}}'
+    if float(value).is_integer():
+        value = int(value)
+    return f'{name} {value}'
+
+
+def render(values):
+    """Текстовый формат Prometheus."""
+    by_name = defaultdict(lambda: defaultdict(dict))
+    for (name, labels, le), value in values.items():
+        by_name[name][labels][le] = value
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        if name not in by_name:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, samples in sorted(by_name[name].items()):
+            if kind == 'counter':
+                lines.append(_sample(name, labels, samples['']))
+                continue
+            for le in [f'{bound:g}' for bound in buckets] + ['+Inf']:
+                lines.append(_sample(f'{name}_bucket', labels,
+                                     samples.get(le, 0), le))
+            lines.append(_sample(f'{name}_sum', labels,
+                                 samples.get('sum', 0)))
+            lines.append(_sample(f'{name}_count', labels,
+                                 samples.get('+Inf', 0)))
+    return '\n'.join(lines) + '\n'
+
+
+def _allowed(request):
+    token = settings.METRICS_TOKEN
+    # Байты, а не строки: compare_digest не принимает не-ASCII строки.
+    if token and hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', '').encode(),
+            f'Bearer {token}'.encode()):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    if not _allowed(request):
+        raise Http404
+    return HttpResponse(render(registry.collect()),
+                        content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Время, SQL-запросы и их время для каждого представления."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        inc('yatube_requests_total', view=view, method=request.method,
+            status=response.status_code)
+        observe('yatube_request_duration_seconds', duration, view=view)
+        observe('yatube_request_queries', stats.count, view=view)
+        observe('yatube_request_sql_seconds', stats.seconds, view=view)
+        registry.flush()
+        return response
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            observe('yatube_template_render_seconds',
+                    time.perf_counter() - started,
+                    template=self.origin.template_name or '<string>')
+
+
+class TimedDjangoTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates, который меряет отрисовку шаблонов верхнего уровня."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,106 @@
+"""
+Чтение лент с реплики базы.
+
+PrimaryReplicaRouter отправляет на реплику (settings.REPLICA_DATABASE)
+только чтения моделей из settings.REPLICA_APPS и только внутри
+GET/HEAD-запросов, которые ReplicaMiddleware разрешила читать с неё.
+Запись, фоновые потоки, команды и всё вне запроса работают с default.
+
+Представления, которые пишут, оборачиваются в sticks_to_primary: они
+читают с default, а если представление что-то сохранило и отметило это
+через mark_written, сессия пользователя ещё
+REPLICA_STICKY_SECONDS секунд читает с default. Так автор сразу видит
+свой пост, даже если реплика отстаёт.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = 'replica'
+STICKY_KEY = '_primary_until'
+
+_state = threading.local()
+
+
+def replica_configured():
+    return REPLICA_ALIAS in connections.databases
+
+
+def read_alias():
+    return getattr(_state, 'alias', DEFAULT_DB_ALIAS)
+
+
+@contextmanager
+def reads_from(alias):
+    previous = read_alias()
+    _state.alias = alias
+    try:
+        yield
+    finally:
+        _state.alias = previous
+
+
+def is_sticky(request):
+    # Без cookie сессии не трогаем request.session: иначе в ответ
+    # попадёт Vary: Cookie.
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return False
+    return request.session.get(STICKY_KEY, 0) > time.time()
+
+
+def mark_written(request):
+    """Отмечает, что представление сохранило данные пользователя."""
+    request.wrote = True
+
+
+def sticks_to_primary(view):
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with reads_from(DEFAULT_DB_ALIAS):
+            response = view(request, *args, **kwargs)
+        # Редирект сам по себе записи не означает: post_edit отправляет
+        # на главную и тех, кто правит чужой пост. Подписка пишет и по
+        # GET, поэтому важна только отметка представления.
+        if getattr(request, 'wrote', False) and hasattr(request, 'session'):
+            request.session[STICKY_KEY] = (
+                time.time() + settings.REPLICA_STICKY_SECONDS)
+        return response
+    return wrapped
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (read_alias() == REPLICA_ALIAS
+                and model._meta.app_label in settings.REPLICA_APPS):
+            return REPLICA_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На реплике те же строки, что и в default.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплику вместе с данными.
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение с реплики запросам, которые ничего не пишут."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        alias = DEFAULT_DB_ALIAS
+        if (replica_configured() and request.method in ('GET', 'HEAD')
+                and not is_sticky(request)):
+            alias = REPLICA_ALIAS
+        with reads_from(alias):
+            return self.get_response(request)
@@ -29,21 +29,24 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'yatube.replica.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-
+    'posts.middleware.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,9 +67,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переживает запрос: не нужно заново открывать файл
+        # и выполнять SQLITE_PRAGMAS.
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
     }
 }
 
+# Копия базы только для чтения лент (yatube/replica.py). Локально это
+# второй файл SQLite, который обновляет manage.py sync_replica.
+REPLICA_DATABASE = os.getenv('REPLICA_DATABASE')
+if REPLICA_DATABASE:
+    DATABASES['replica'] = dict(
+        DATABASES['default'], NAME=REPLICA_DATABASE,
+        TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['yatube.replica.PrimaryReplicaRouter']
+# Приложения, модели которых можно читать с реплики.
+REPLICA_APPS = ('posts',)
+# Сколько секунд после записи сессия автора читает с default.
+REPLICA_STICKY_SECONDS = 10
+
+# Выполняются на каждом новом соединении SQLite (yatube/sqlite.py).
+# mmap_size в байтах, cache_size со знаком минус - в килобайтах,
+# busy_timeout в миллисекундах.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -96,10 +128,24 @@ STATIC_URL = '/static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
+# collectstatic пишет имена с хешем содержимого и .gz-копии, отдаёт их
+# yatube.staticfiles.PrecompressedStaticHandler.
+STATICFILES_STORAGE = 'yatube.staticfiles.GzipManifestStaticFilesStorage'
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки пишутся на диск кусками, а не собираются в памяти.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedTemporaryFileUploadHandler']
+
+# Пределы для картинок постов: размер файла, число пикселей по
+# заголовку (защита от «бомб») и сторона, до которой уменьшаются
+# большие исходники.
+IMAGE_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 25_000_000
+IMAGE_MAX_SIDE = 2560
+
 LOGIN_URL = '/auth/login/'
 
 LOGIN_REDIRECT_URL = 'index'
@@ -108,10 +154,115 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# С несколькими процессами gunicorn задайте CACHE_DIR: тогда у каждого
+# процесса будет свой LRU поверх общего файла SQLite.
+CACHE_DIR = os.getenv("CACHE_DIR")
+
+if CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache.TwoTierCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+                'L1_MAX_ENTRIES': 1000,
+                'CHECK_INTERVAL': 1,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
+
+# Общий для процессов файл счётчиков /metrics; без CACHE_DIR счётчики
+# у каждого процесса свои.
+METRICS_PATH = (os.path.join(CACHE_DIR, 'metrics.sqlite3')
+                if CACHE_DIR else None)
+METRICS_FLUSH_INTERVAL = 1
+# /metrics отдаётся только с заголовком Authorization: Bearer
+# METRICS_TOKEN или адресам из METRICS_ALLOWED_IPS; без них - 404.
+# Локальные адреса по умолчанию не разрешены: за nginx на той же
+# машине REMOTE_ADDR любого посетителя - 127.0.0.1.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_ALLOWED_IPS = [
+    address for address in os.getenv('METRICS_ALLOWED_IPS', '').split(',')
+    if address]
+
+# Запросы дольше стольких миллисекунд пишутся в SLOW_QUERY_LOG (см.
+# yatube/slow_queries.py); пустое значение отключает журнал.
+SLOW_QUERY_MS = os.getenv('SLOW_QUERY_MS', '100')
+SLOW_QUERY_MS = float(SLOW_QUERY_MS) if SLOW_QUERY_MS else None
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'slow_queries.jsonl'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {'message': {'format': '%(message)s'}},
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 COUNT_PAGINATOR = 10
+
+# Фрагменты лент сбрасываются сменой поколения, а не по времени.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Сколько после истечения срока кеш отдаёт устаревшую копию, пока один
+# процесс пересчитывает значение.
+CACHE_STALE_TIMEOUT = 60 * 60
+
+# Страницы, которые анонимным посетителям отдаются из кеша целиком.
+PAGE_CACHE_VIEWS = ('index', 'group', 'profile', 'post')
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Сколько последних постов каждый процесс держит в памяти для первых
+# страниц главной; 0 отключает буфер.
+HOT_FEED_SIZE = 50
+
+# Миниатюры, которые используют шаблоны: имя -> (геометрия, параметры
+# sorl). Они рисуются в фоне THUMBNAIL_WORKERS потоками; 0 - сразу после
+# фиксации транзакции, в том же потоке. Тесты ставят 0 (override_settings,
+# conftest.py): общую базу SQLite в памяти потоки пула делят с
+# блокировкой целых таблиц.
+THUMBNAIL_GEOMETRIES = {
+    'post': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Варианты картинки поста для srcset: ширины, форматы и качество.
+# IMAGE_VARIANT_SIZES попадает в атрибут sizes.
+IMAGE_VARIANT_WIDTHS = (320, 640, 960, 1280)
+IMAGE_VARIANT_FORMATS = ('WEBP', 'JPEG')
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_SIZES = '(max-width: 1140px) 100vw, 1110px'
+
+# Ссылки вида ?page=N обслуживаются через OFFSET только до этой страницы,
+# дальше лента листается курсорами.
+PAGINATOR_MAX_OFFSET_PAGE = 50
+
+# Посты авторов, у которых подписчиков больше лимита, не раскладываются
+# по лентам подписчиков, а подмешиваются в ленту при чтении.
+TIMELINE_FANOUT_LIMIT = 10000
+
+# Сколько последних постов автора попадает в ленту при подписке.
+TIMELINE_BACKFILL_LIMIT = 200
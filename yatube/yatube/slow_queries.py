@@ -0,0 +1,163 @@
+"""
+Журнал медленных SQL-запросов.
+
+Каждое соединение получает execute_wrapper, который пишет в логгер
+yatube.slow_queries (в settings - ротируемый файл SLOW_QUERY_LOG) все
+запросы дольше SLOW_QUERY_MS миллисекунд, по строке JSON на запрос:
+представление, узел шаблона и строка, откуда пришёл запрос, ближайшая
+строка кода проекта, параметры и план запроса. Сводку по журналу
+строит команда slow_queries.
+
+Время - только execute(): строки, которые Django дочитывает из курсора
+позже, в него не входят.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.base import Node
+
+logger = logging.getLogger('yatube.slow_queries')
+
+_state = threading.local()
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+VALUES = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    SQL без конкретных значений: запросы, которые отличаются только
+    литералами или длиной списка IN (...), совпадают.
+    """
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = VALUES.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def fingerprint_id(fingerprint):
+    return hashlib.md5(fingerprint.encode()).hexdigest()[:12]
+
+
+def _template_position():
+    """Шаблон и строка самого глубокого узла, который сейчас рисуется."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code is Node.render_annotated.__code__:
+            node = frame.f_locals['self']
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            return (getattr(origin, 'template_name', None),
+                    getattr(token, 'lineno', None))
+        frame = frame.f_back
+    return None, None
+
+
+def _source():
+    """
+    Ближайшая к запросу строка кода проекта. Обёртки из пакета yatube
+    (метрики, реплика, этот журнал) пропускаются.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(settings.BASE_DIR)
+                and os.path.dirname(filename) != PACKAGE_DIR):
+            return (f'{os.path.relpath(filename, settings.BASE_DIR)}:'
+                    f'{frame.f_lineno}')
+        frame = frame.f_back
+    return None
+
+
+def _plan(connection, sql, params):
+    words = sql.split(None, 1)
+    if not words or words[0].upper() not in ('SELECT', 'WITH'):
+        return None
+    prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+              else 'EXPLAIN ')
+    # Отдельный курсор без обёрток: результат основного запроса ещё
+    # не прочитан, а сам EXPLAIN в журнал попадать не должен.
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(prefix + sql, params)
+        if connection.vendor == 'sqlite':
+            # id, parent, notused, detail - нужен только detail.
+            return [row[-1] for row in cursor.fetchall()]
+        return [' '.join(str(column) for column in row)
+                for row in cursor.fetchall()]
+    except Exception as exc:
+        return [f'EXPLAIN не удался: {exc}']
+    finally:
+        cursor.close()
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_MS
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        if ms >= threshold:
+            connection = context['connection']
+            template, line = _template_position()
+            request = getattr(_state, 'request', None)
+            match = getattr(request, 'resolver_match', None)
+            normalized = fingerprint(sql)
+            logger.warning(json.dumps({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'ms': round(ms, 2),
+                'alias': connection.alias,
+                'view': match.view_name if match is not None else None,
+                'path': request.path if request is not None else None,
+                'template': template,
+                'line': line,
+                'source': _source(),
+                'sql': sql,
+                # У executemany параметры бывают генератором.
+                'params': None if many else params,
+                'many': many,
+                'plan': None if many else _plan(connection, sql, params),
+                'fingerprint': fingerprint_id(normalized),
+                'normalized': normalized,
+            }, ensure_ascii=False, default=str))
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    # Объект соединения переживает переподключения, а сигнал - нет.
+    # Вставка в начало списка: connection.execute_wrapper() снимает
+    # последнюю обёртку, и если соединение открылось посреди запроса,
+    # MetricsMiddleware сняла бы наш журнал вместо своей обёртки.
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_queries)
+
+
+class SlowQueryMiddleware:
+    """Запоминает текущий запрос, чтобы журнал знал представление."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.request = request
+        try:
+            return self.get_response(request)
+        finally:
+            _state.request = None
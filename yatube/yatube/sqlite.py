@@ -0,0 +1,37 @@
+"""
+Настройка соединений SQLite для работы под нагрузкой.
+
+Каждое новое соединение получает PRAGMA из settings.SQLITE_PRAGMAS.
+WAL позволяет читать во время записи, busy_timeout заставляет писателя
+подождать чужую транзакцию, а не сразу падать с «database is locked».
+Вместе с CONN_MAX_AGE соединение и его настройки живут дольше одного
+запроса.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def set_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if connection.is_in_memory_db():
+        # У базы в памяти нет ни журнала на диске, ни файла для mmap.
+        pragmas.pop('journal_mode', None)
+        pragmas.pop('mmap_size', None)
+    busy_timeout = pragmas.pop('busy_timeout', None)
+    journal_mode = pragmas.pop('journal_mode', None)
+    with connection.cursor() as cursor:
+        # Сначала ожидание, чтобы остальные PRAGMA ждали чужую запись.
+        if busy_timeout is not None:
+            cursor.execute(f'PRAGMA busy_timeout = {busy_timeout}')
+        if journal_mode is not None:
+            # Переход в WAL чужую запись не ждёт. Режим хранится в файле
+            # базы, и обычно его уже включило первое соединение.
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0].lower() != str(journal_mode).lower():
+                cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,129 @@
+"""
+Статика с хешами в именах и заранее сжатыми копиями.
+
+GzipManifestStaticFilesStorage при collectstatic пишет файлы с хешем
+содержимого в имени (bootstrap.min.3f2a….css), манифест для тега
+{% static %} и рядом с текстовыми файлами их .gz.
+
+PrecompressedStaticHandler отдаёт STATIC_URL и MEDIA_URL прямо из
+WSGI, не доходя до Django: .gz-копию, если клиент принимает gzip, и
+Cache-Control: immutable для имён, которые не меняют содержимого
+(хешированная статика и картинки постов из posts.storage). Если перед
+приложением стоит nginx, те же правила выглядят так:
+
+    location /static/ {
+        alias /srv/yatube/static/;
+        gzip_static on;
+        location ~ "\\.[0-9a-f]{12}\\.\\w+$" {
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
+    }
+"""
+import gzip
+import io
+import mimetypes
+import os
+import re
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.html', '.json', '.map',
+                '.xml', '.ico')
+# Меньшие файлы сжатие почти не уменьшает.
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=60'
+HASHED_STATIC = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+HASHED_MEDIA = re.compile(r'/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+class GzipManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Без манифеста (тесты, свежий checkout) ссылка строится на файл
+    # без хеша, а не роняет страницу.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        for original, processed, done in super().post_process(
+                paths, dry_run, **options):
+            if done and processed and not dry_run:
+                self.compress(processed)
+            yield original, processed, done
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE):
+            return
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            content = source.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        # mtime=0: одинаковый файл даёт одинаковый архив. GzipFile, а не
+        # gzip.compress: параметр mtime у неё появился только в 3.8.
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9,
+                           mtime=0) as archive:
+            archive.write(content)
+        compressed = buffer.getvalue()
+        if len(compressed) < len(content):
+            with open(path + '.gz', 'wb') as target:
+                target.write(compressed)
+
+
+class PrecompressedStaticHandler:
+    """WSGI-обёртка, которая отдаёт статику и медиа с диска."""
+
+    def __init__(self, application):
+        self.application = application
+        self.roots = [
+            (settings.STATIC_URL, settings.STATIC_ROOT, HASHED_STATIC),
+            (settings.MEDIA_URL, settings.MEDIA_ROOT, HASHED_MEDIA),
+        ]
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            path = environ.get('PATH_INFO', '')
+            for prefix, root, hashed in self.roots:
+                if root and path.startswith(prefix):
+                    response = self.serve(environ, start_response, root,
+                                          path[len(prefix):], hashed)
+                    if response is not None:
+                        return response
+        return self.application(environ, start_response)
+
+    def resolve(self, root, name):
+        root = os.path.realpath(root)
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root:
+            return None
+        return path if os.path.isfile(path) else None
+
+    def serve(self, environ, start_response, root, name, hashed):
+        path = self.resolve(root, name)
+        if path is None:
+            return None
+        content_type = mimetypes.guess_type(path)[0]
+        headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Cache-Control',
+             IMMUTABLE if hashed.search('/' + name) else REVALIDATE),
+        ]
+        if path.endswith(COMPRESSIBLE):
+            headers.append(('Vary', 'Accept-Encoding'))
+            accepts = environ.get('HTTP_ACCEPT_ENCODING', '')
+            if 'gzip' in accepts and os.path.isfile(path + '.gz'):
+                path += '.gz'
+                headers.append(('Content-Encoding', 'gzip'))
+        headers.append(('Content-Length', str(os.path.getsize(path))))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(path, 'rb'))
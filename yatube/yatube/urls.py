@@ -4,10 +4,14 @@ from django.conf import settings
 from django.conf.urls import handler404, handler500
 from django.conf.urls.static import static
 
+from yatube.metrics import metrics_view
+
 handler404 = "posts.views.page_not_found"
 handler500 = "posts.views.server_error"
 
 urlpatterns = [
+    # Раньше posts.urls, где metrics/ занял бы профиль «metrics».
+    path('metrics', metrics_view, name='metrics'),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path("", include("posts.urls")),
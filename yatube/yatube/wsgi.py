@@ -4,4 +4,28 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
-application = get_wsgi_application()
+from yatube.staticfiles import PrecompressedStaticHandler  # noqa: E402
+
+application = PrecompressedStaticHandler(get_wsgi_application())
+
+from django.core.signals import request_started  # noqa: E402
+from django.db import DatabaseError  # noqa: E402
+
+from posts import hot_feed  # noqa: E402
+
+
+def warm_up(**kwargs):
+    """
+    Заполняет буфер последних постов при первом запросе процесса, а не
+    при импорте: с gunicorn --preload соединение мастера с CONN_MAX_AGE
+    досталось бы после fork всем воркерам. Если база недоступна, буфер
+    заполнится при первом запросе главной.
+    """
+    request_started.disconnect(warm_up)
+    try:
+        hot_feed.feed.warm_up()
+    except DatabaseError:
+        pass
+
+
+request_started.connect(warm_up)